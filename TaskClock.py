@@ -0,0 +1,157 @@
+# 时钟服务
+'''
+全局唯一的时间来源
+
+时区只解析一次,优先使用 zoneinfo,不可用时退回 pytz。
+墙上时间由单调时钟推算,定期与系统时间校准;耗时统计统一使用 perf_counter_ns,
+调度的截止时间统一使用单调时钟,系统时间跳变不会影响执行耗时和循环间隔,
+墙上时间只用于时间表达式的匹配
+'''
+import datetime,threading,time
+from bdpyconsts import bdpyconsts
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
+# 墙上时间与系统时间的校准间隔(秒)
+_RESYNC_SECONDS = 60.0
+
+# 时区名称
+_TIME_ZONE_NAME = bdpyconsts.TIME_ZONE
+if not _TIME_ZONE_NAME:
+    _TIME_ZONE_NAME = "Asia/Shanghai"
+
+# 时区对象
+if zoneinfo != None:
+    try:
+        _TIME_ZONE = zoneinfo.ZoneInfo(_TIME_ZONE_NAME)
+    except Exception:
+        _TIME_ZONE = None
+else:
+    _TIME_ZONE = None
+if _TIME_ZONE == None:
+    import pytz
+    _TIME_ZONE = pytz.timezone(_TIME_ZONE_NAME)
+
+# 校准基准 (系统时间戳,单调时钟)
+_BASE = (time.time(),time.monotonic())
+# 校准锁
+_BASE_LOCK = threading.Lock()
+
+
+def Zone():
+    """
+    获取时区对象
+
+    :return: tzinfo
+    """
+    return _TIME_ZONE
+
+
+def ZoneName() -> str:
+    """
+    获取时区名称
+
+    :return: str
+    """
+    return _TIME_ZONE_NAME
+
+
+def Resync():
+    """
+    用系统时间重新校准墙上时间基准
+
+    :return:
+    """
+    global _BASE
+    with _BASE_LOCK:
+        _BASE = (time.time(),time.monotonic())
+
+
+def NowTs() -> float:
+    """
+    当前时间戳(秒),由单调时钟推算
+
+    :return: float
+    """
+    wall,mono = _BASE
+    elapsed = time.monotonic() - mono
+    if elapsed > _RESYNC_SECONDS:
+        Resync()
+        wall,mono = _BASE
+        elapsed = time.monotonic() - mono
+    return wall + elapsed
+
+
+def MonoTs() -> float:
+    """
+    单调时钟(秒),用于调度的截止时间和循环间隔
+
+    :return: float
+    """
+    return time.monotonic()
+
+
+def TsToMono(ts:float) -> float:
+    """
+    墙上时间戳按当前校准换算为单调时钟
+
+    :param ts: float 时间戳(秒)
+    :return: float
+    """
+    return ts - NowTs() + MonoTs()
+
+
+def MonoToTs(mono:float) -> float:
+    """
+    单调时钟按当前校准换算为墙上时间戳
+
+    :param mono: float 单调时钟(秒)
+    :return: float
+    """
+    return mono - MonoTs() + NowTs()
+
+
+def Now() -> datetime.datetime:
+    """
+    当前时间,带时区
+
+    :return: datetime
+    """
+    return datetime.datetime.fromtimestamp(NowTs(),_TIME_ZONE)
+
+
+def FromTs(ts:float) -> datetime.datetime:
+    """
+    时间戳转换为带时区的时间
+
+    :param ts: float 时间戳(秒)
+    :return: datetime
+    """
+    return datetime.datetime.fromtimestamp(ts,_TIME_ZONE)
+
+
+def Localize(tm:datetime.datetime) -> datetime.datetime:
+    """
+    为本地时间附加时区,已带时区的时间转换到本时区
+
+    :param tm: datetime 时间
+    :return: datetime
+    """
+    if tm.tzinfo != None:
+        return tm.astimezone(_TIME_ZONE)
+    # pytz 时区需要 localize 才能得到正确的偏移
+    if hasattr(_TIME_ZONE,"localize"):
+        return _TIME_ZONE.localize(tm)
+    return tm.replace(tzinfo=_TIME_ZONE)
+
+
+def PerfNs() -> int:
+    """
+    高精度单调计时(纳秒),只用于计算耗时
+
+    :return: int
+    """
+    return time.perf_counter_ns()
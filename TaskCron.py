@@ -17,13 +17,9 @@
 *   分 0-59/60
 *   秒 0-59/60
 '''
-import abc,datetime,re,pytz
-from bdpyconsts import bdpyconsts
-
-# 时区
-_TIME_ZONE = bdpyconsts.TIME_ZONE
-if not _TIME_ZONE:
-    _TIME_ZONE = "Asia/Shanghai"
+import abc,bisect,calendar,collections,datetime,heapq,math,re,threading,weakref,zlib
+from array import array
+import TaskClock
 
 #指定时间点正则
 _TIME_HIT_POINT_PREG = re.compile(r'^\d+(\,\d+)+$')
@@ -36,6 +32,22 @@ _TIME_HIT_RANGE_TIMES_PREG = re.compile(r'^\d+\/\d+\-\d+$')
 #指定范围指定时间点正则
 _TIME_HIT_RANGE_POINT_PREG = re.compile(r'^\d+(\,\d+)+\/\d+\-\d+$')
 
+# 查找下次执行时间的最大年份跨度,公历 400 年一个完整周期(含星期)
+_SEARCH_YEARS = 400
+# 一秒
+_ONE_SECOND = datetime.timedelta(seconds=1)
+
+# 编译缓存大小(按规范化后的表达式)
+_CRON_CACHE_SIZE = 1024
+# 编译缓存 {规范化表达式:CompiledCron}
+_CRON_CACHE = collections.OrderedDict()
+# 等价表达式共享 {位掩码签名:CompiledCron}
+_CRON_INTERN = weakref.WeakValueDictionary()
+# 编译缓存锁
+_CRON_CACHE_LOCK = threading.Lock()
+# 编译缓存统计
+_CRON_CACHE_STAT = {"hits":0,"misses":0,"shared":0}
+
 def IsTimeHit(con:str,tm:datetime.datetime=None) -> bool:
     """
     判断时间是否命中
@@ -48,7 +60,7 @@ def IsTimeHit(con:str,tm:datetime.datetime=None) -> bool:
         return False
     
     if not tm:
-        tm = datetime.datetime.now(tz=pytz.timezone(_TIME_ZONE))
+        tm = TaskClock.Now()
     
     # 年判断
     year = Year(tm=tm)
@@ -162,7 +174,7 @@ class Cron:
         
         if _TIME_HIT_TIMES_PREG.match(self.__con):
             tms = int(self.__con.strip("*/"))
-            if tms == 0 or (not min or not max):
+            if tms == 0 or min is None or max is None:
                 self.__hit_flg = self.TIME_HIT_NEVER
                 return
             self.__hit_flg = self.TIME_HIT_TIMES
@@ -186,7 +198,7 @@ class Cron:
                 return
             self.__hit_flg = self.TIME_HIT_RANGE_TIMES
             block = long / tms
-            while vmi <= vmax:
+            while vmi <= vmx:
                 self.__hit_point.add(vmi)
                 vmi += block
             return
@@ -203,7 +215,7 @@ class Cron:
             self.__hit_flg = self.TIME_HIT_RANGE_POINT
             for p in pts:
                 pv = int(p)
-                if p >= rmi and p <= rmx:
+                if pv >= rmi and pv <= rmx:
                     self.__hit_point.add(pv)
             return
         
@@ -223,7 +235,791 @@ class Cron:
             return True
         
         return point in self.__hit_point
+    
+    def mask(self,) -> int:
+        """
+        将解析结果转换为位掩码,第 n 位为 1 表示时间点 n 命中
+        
+        :return: int 位掩码|-1 表示任意时间点
+        """
+        if self.__hit_flg == None or self.__hit_flg == self.TIME_HIT_NEVER:
+            return 0
+        if self.__hit_flg == self.TIME_HIT_ANYWAY:
+            return -1
         
+        # 按次数切分出的小数时间点永远不会命中,与 hit 的判断保持一致
+        bits = 0
+        for p in self.__hit_point:
+            if p == int(p) and p >= 0:
+                bits |= 1 << int(p)
+        return bits
+
+
+def _compile_mask(con:str,min:int,max:int) -> int:
+    """
+    编译单个时间单元的表达式为位掩码
+    
+    :param con: str 时间单元表达式
+    :param min: int 最小时间值
+    :param max: int 最大时间值
+    :return: int 位掩码
+    """
+    croner = Cron()
+    croner.load(con)
+    croner.parse(min,max)
+    return croner.mask()
+
+
+def _next_bit(mask:int,start:int,max:int):
+    """
+    查找掩码中 [start,max] 范围内最小的命中值
+    
+    :param mask: int 位掩码
+    :param start: int 起始值
+    :param max: int 最大值
+    :return: int|None
+    """
+    if start > max:
+        return None
+    bits = ((mask >> start) << start) & ((1 << (max + 1)) - 1)
+    if not bits:
+        return None
+    return (bits & -bits).bit_length() - 1
+
+
+def _prev_bit(mask:int,start:int,min:int):
+    """
+    查找掩码中 [min,start] 范围内最大的命中值
+    
+    :param mask: int 位掩码
+    :param start: int 起始值
+    :param min: int 最小值
+    :return: int|None
+    """
+    if start < min:
+        return None
+    bits = ((mask & ((1 << (start + 1)) - 1)) >> min) << min
+    if not bits:
+        return None
+    return bits.bit_length() - 1
+
+
+def _attach_tz(tm:datetime.datetime,tzinfo) -> datetime.datetime:
+    """
+    为本地时间附加时区
+    
+    :param tm: datetime 不带时区的时间
+    :param tzinfo: 时区对象
+    :return: datetime
+    """
+    if tzinfo == None:
+        return tm
+    # pytz 时区需要 localize 才能得到正确的偏移
+    if hasattr(tzinfo,"localize"):
+        return tzinfo.localize(tm)
+    return tm.replace(tzinfo=tzinfo)
+
+
+def _exists(tm:datetime.datetime,tzinfo) -> bool:
+    """
+    本地时间在时区中是否存在,夏令时开始时跳过的时间不存在
+    
+    :param tm: datetime 不带时区的时间
+    :param tzinfo: 时区对象
+    :return: bool
+    """
+    if tzinfo == None:
+        return True
+    aware = _attach_tz(tm,tzinfo)
+    return aware.astimezone(datetime.timezone.utc).astimezone(tzinfo).replace(tzinfo=None) == tm
+
+
+def _unfold(tm:datetime.datetime,ref:datetime.datetime,forward:bool) -> datetime.datetime:
+    """
+    ref 为夏令时结束时重复时间的第二次出现(fold=1)时,把查找起点移到按真实时间正确的位置
+    
+    重复的时间只在第一次出现时执行,第二次出现在真实时间上晚于整段重复时间的第一次出现,
+    向后查找要从重复区间结束处开始,向前查找要从重复区间的最后一秒开始
+    
+    :param tm: datetime 不带时区的查找起点
+    :param ref: datetime 带时区的起始/截止时间
+    :param forward: bool 是否向后查找
+    :return: datetime 不带时区
+    """
+    if ref.tzinfo == None or not ref.fold:
+        return tm
+    diff = int((ref.replace(fold=0).utcoffset() - ref.utcoffset()).total_seconds())
+    if diff <= 0:
+        return tm
+    
+    # 第一次出现的真实时间随墙上时间单调不减,二分查找边界
+    ts = ref.timestamp()
+    lo,hi = 0,diff
+    while lo < hi:
+        if forward:
+            mid = (lo + hi) // 2
+            if _attach_tz(tm + datetime.timedelta(seconds=mid),ref.tzinfo).timestamp() > ts:
+                hi = mid
+            else:
+                lo = mid + 1
+        else:
+            mid = (lo + hi + 1) // 2
+            if _attach_tz(tm + datetime.timedelta(seconds=mid),ref.tzinfo).timestamp() < ts:
+                lo = mid
+            else:
+                hi = mid - 1
+    return tm + datetime.timedelta(seconds=lo)
+
+
+class CompiledCron:
+    """
+    预编译的定时表达式
+    
+    注册时解析一次,将年/月/日/周/时/分/秒各字段保存为整数位掩码,
+    判断命中时只做位运算,结果与 IsTimeHit 一致
+    """
+    
+    # 命中判断复用次数,热路径上不加锁,多线程同时判断时为近似值
+    match_hits = 0
+    # 命中判断计算次数,同上为近似值
+    match_misses = 0
+    
+    def __init__(self,con:str):
+        """
+        编译定时表达式
+        
+        :param con: str 定时表达式
+        """
+        # 时间表达式
+        self.con = con
+        # 表达式是否有效
+        self.valid = False
+        # 年
+        self.year = 0
+        # 月
+        self.month = 0
+        # 日 按月份天数区分 {天数:掩码}
+        self.days = {28:0,29:0,30:0,31:0}
+        # 周
+        self.week = 0
+        # 时
+        self.hour = 0
+        # 分
+        self.minute = 0
+        # 秒
+        self.second = 0
+        # 最近一次命中判断 (时间,结果),同一秒内多个任务共享
+        self.__memo = (None,False)
+        # 当天执行时间线 (日期,零点起的秒数 array('I'))
+        self.__timeline = (None,array("I"))
+        # 掩码展开缓存 {(掩码,最小值,最大值):命中值}
+        self.__bits_cache = {}
+        # 执行日内的执行时间线
+        self.__intraday = None
+        
+        cons = con.strip().split(" ")
+        if len(cons) != 7:
+            return
+        
+        self.valid = True
+        self.year = _compile_mask(cons[0],None,None)
+        self.month = _compile_mask(cons[1],1,12)
+        for long in self.days:
+            self.days[long] = _compile_mask(cons[2],1,long)
+        self.week = _compile_mask(cons[3],1,7)
+        self.hour = _compile_mask(cons[4],0,23)
+        self.minute = _compile_mask(cons[5],0,59)
+        self.second = _compile_mask(cons[6],0,59)
+    
+    def day_mask(self,year:int,month:int) -> int:
+        """
+        获取指定月份的日掩码
+        
+        :param year: int 年
+        :param month: int 月
+        :return: int 位掩码
+        """
+        return self.days[calendar.monthrange(year,month)[1]]
+    
+    def never(self,) -> bool:
+        """
+        是否永不命中
+        
+        :return: bool
+        """
+        if not self.valid:
+            return True
+        return not (self.year and self.month and self.week and self.hour and self.minute and self.second and any(self.days.values()))
+    
+    def signature(self,) -> tuple:
+        """
+        位掩码签名,签名相同的表达式等价
+        
+        :return: tuple
+        """
+        return (self.valid,self.year,self.month,tuple(sorted(self.days.items())),self.week,self.hour,self.minute,self.second)
+    
+    def matches(self,tm:datetime.datetime=None) -> bool:
+        """
+        判断时间是否命中,同一时间的重复判断直接返回上次结果
+        
+        :param tm: datetime 时间对象
+        :return: bool
+        """
+        if not self.valid:
+            return False
+        
+        if not tm:
+            tm = TaskClock.Now()
+        
+        # 同一时刻但时区不同时字段不同,不能复用
+        memo = self.__memo
+        if memo[0] is tm or (memo[0] == tm and memo[0].tzinfo is tm.tzinfo):
+            CompiledCron.match_hits += 1
+            return memo[1]
+        
+        CompiledCron.match_misses += 1
+        hit = self.__match(tm)
+        self.__memo = (tm,hit)
+        return hit
+    
+    def __match(self,tm:datetime.datetime) -> bool:
+        """
+        按位掩码判断时间是否命中
+        
+        :param tm: datetime 时间对象
+        :return: bool
+        """
+        if not (self.second >> tm.second) & 1:
+            return False
+        if not (self.minute >> tm.minute) & 1:
+            return False
+        if not (self.hour >> tm.hour) & 1:
+            return False
+        if not (self.week >> (tm.weekday() + 1)) & 1:
+            return False
+        if not (self.month >> tm.month) & 1:
+            return False
+        if not (self.year >> tm.year) & 1:
+            return False
+        return bool((self.day_mask(tm.year,tm.month) >> tm.day) & 1)
+    
+    def __bits(self,mask:int,min:int,max:int) -> tuple:
+        """
+        列出掩码在 [min,max] 内的命中值
+        
+        :return: tuple
+        """
+        key = (mask,min,max)
+        bits = self.__bits_cache.get(key)
+        if bits == None:
+            bits = tuple(v for v in range(min,max + 1) if (mask >> v) & 1)
+            self.__bits_cache[key] = bits
+        return bits
+    
+    def fires_on(self,year:int,month:int,day:int) -> bool:
+        """
+        某天是否命中年/月/日/周
+        
+        :param year: int 年
+        :param month: int 月
+        :param day: int 日
+        :return: bool
+        """
+        if not self.valid:
+            return False
+        if not (self.year >> year) & 1 or not (self.month >> month) & 1:
+            return False
+        if not (self.day_mask(year,month) >> day) & 1:
+            return False
+        return bool((self.week >> (calendar.weekday(year,month,day) + 1)) & 1)
+    
+    def intraday(self,) -> array:
+        """
+        执行日内的执行时间线,与具体日期无关,只生成一次
+        
+        :return: array('I') 零点起的秒数
+        """
+        offsets = self.__intraday
+        if offsets == None:
+            offsets = array("I",self.iter_intraday())
+            self.__intraday = offsets
+        return offsets
+    
+    def iter_intraday(self,start:int=0):
+        """
+        惰性遍历执行日内不早于 start 的执行时间,不展开整天的时间线
+        
+        :param start: int 零点起的秒数
+        :return: Generator[int] 零点起的秒数,升序
+        """
+        h0,rest = divmod(start,3600)
+        m0,s0 = divmod(rest,60)
+        hours = self.__bits(self.hour,0,23)
+        minutes = self.__bits(self.minute,0,59)
+        seconds = self.__bits(self.second,0,59)
+        for hour in hours[bisect.bisect_left(hours,h0):]:
+            first = hour == h0
+            for minute in minutes[bisect.bisect_left(minutes,m0):] if first else minutes:
+                base = hour * 3600 + minute * 60
+                if first and minute == m0:
+                    for second in seconds[bisect.bisect_left(seconds,s0):]:
+                        yield base + second
+                else:
+                    for second in seconds:
+                        yield base + second
+    
+    def __day_offsets(self,day:datetime.datetime) -> array:
+        """
+        某天的执行时间线
+        
+        时区偏移变化(夏令时)的日期按实际经过的秒数换算,跳过不存在的时间,重复的时间只取第一次
+        
+        :param day: datetime 本地时间
+        :return: array('I') 零点起实际经过的秒数
+        """
+        if not self.fires_on(day.year,day.month,day.day):
+            return array("I")
+        
+        tz = TaskClock.Zone()
+        midnight = datetime.datetime(day.year,day.month,day.day)
+        base = int(_attach_tz(midnight,tz).timestamp())
+        if int(_attach_tz(midnight + datetime.timedelta(days=1),tz).timestamp()) - base == 86400:
+            return self.intraday()
+        
+        offsets = array("I")
+        for offset in self.iter_intraday():
+            tm = midnight + datetime.timedelta(seconds=offset)
+            if _exists(tm,tz):
+                offsets.append(int(_attach_tz(tm,tz).timestamp()) - base)
+        return offsets
+    
+    def timeline(self,day:datetime.datetime=None) -> array:
+        """
+        获取某天的执行时间线,为零点起实际经过的秒数升序数组
+        
+        按 bdpyconsts.TIME_ZONE 的本地日期计算,日期变更时重新生成。
+        夏令时切换的日期与 iter_fire_times 一致:跳过不存在的时间,重复的时间只执行一次
+        
+        :param day: datetime 当天任意时间,默认当前时间
+        :return: array('I')
+        """
+        tz = TaskClock.Zone()
+        if not day:
+            day = TaskClock.Now()
+        elif day.tzinfo != None:
+            day = day.astimezone(tz)
+        
+        key = day.date()
+        cached = self.__timeline
+        if cached[0] == key:
+            return cached[1]
+        
+        offsets = self.__day_offsets(day)
+        self.__timeline = (key,offsets)
+        return offsets
+    
+    def runs_today(self,day:datetime.datetime=None) -> int:
+        """
+        当天的执行次数
+        
+        :param day: datetime 当天任意时间,默认当前时间
+        :return: int
+        """
+        return len(self.timeline(day=day))
+    
+    def next_fire_today(self,after:datetime.datetime=None):
+        """
+        在当天时间线上二分查找下一次执行时间,当天已无执行时退回 next_fire_time
+        
+        :param after: datetime 起始时间,默认当前时间
+        :return: datetime|None
+        """
+        if not after:
+            after = TaskClock.Now()
+        
+        tz = TaskClock.Zone()
+        local = after.astimezone(tz) if after.tzinfo != None else _attach_tz(after,tz)
+        
+        offsets = self.timeline(day=local)
+        base = int(_attach_tz(datetime.datetime(local.year,local.month,local.day),tz).timestamp())
+        i = bisect.bisect_right(offsets,math.floor(local.timestamp()) - base)
+        if i < len(offsets):
+            tm = TaskClock.FromTs(base + offsets[i])
+            if after.tzinfo != None:
+                return tm.astimezone(after.tzinfo)
+            return tm.replace(tzinfo=None)
+        
+        return self.next_fire_time(after=after)
+    
+    def iter_fire_stamps(self,start:datetime.datetime,end:datetime.datetime):
+        """
+        惰性遍历 [start,end) 内的执行时间戳
+        
+        :param start: datetime 开始时间(含)
+        :param end: datetime 结束时间(不含)
+        :return: Generator[int] 秒级时间戳
+        """
+        for ts,_ in IterFireStamps([self],start=start,end=end):
+            yield ts
+    
+    def iter_fire_times(self,start:datetime.datetime,end:datetime.datetime):
+        """
+        惰性遍历 [start,end) 内的执行时间
+        
+        :param start: datetime 开始时间(含)
+        :param end: datetime 结束时间(不含)
+        :return: Generator[datetime] 带时区输入返回 bdpyconsts.TIME_ZONE 时间,否则返回本地时间
+        """
+        cache = {}
+        for ts in self.iter_fire_stamps(start=start,end=end):
+            tm = StampToTime(ts,cache)
+            yield tm if start.tzinfo != None else tm.replace(tzinfo=None)
+    
+    def __day_hit(self,year:int,month:int,day:int,mdays:int) -> bool:
+        """
+        判断某天是否同时命中日和周
+        
+        :param year: int 年
+        :param month: int 月
+        :param day: int 日
+        :param mdays: int 当月天数
+        :return: bool
+        """
+        if not (self.days[mdays] >> day) & 1:
+            return False
+        return bool((self.week >> (calendar.weekday(year,month,day) + 1)) & 1)
+    
+    def next_fire_time(self,after:datetime.datetime=None):
+        """
+        获取指定时间之后(不含)的下一次执行时间
+        
+        按 年->月->日->时->分->秒 逐字段跳跃查找,不逐秒遍历
+        
+        :param after: datetime 起始时间,默认当前时间
+        :return: datetime|None 永不执行时返回 None
+        """
+        if self.never():
+            return None
+        
+        if not after:
+            after = TaskClock.Now()
+        tzinfo = after.tzinfo
+        tm = _unfold(after.replace(tzinfo=None,microsecond=0,fold=0) + _ONE_SECOND,after,True)
+        limit = min(after.year + _SEARCH_YEARS,datetime.MAXYEAR - 1)
+        
+        while tm.year <= limit:
+            # 年
+            year = _next_bit(self.year,tm.year,limit)
+            if year == None:
+                return None
+            if year != tm.year:
+                tm = datetime.datetime(year,1,1)
+            
+            # 月
+            month = _next_bit(self.month,tm.month,12)
+            if month == None:
+                tm = datetime.datetime(tm.year + 1,1,1)
+                continue
+            if month != tm.month:
+                tm = datetime.datetime(tm.year,month,1)
+            
+            # 日 + 周
+            mdays = calendar.monthrange(tm.year,tm.month)[1]
+            day = tm.day
+            while day <= mdays and not self.__day_hit(tm.year,tm.month,day,mdays):
+                day += 1
+            if day > mdays:
+                tm = datetime.datetime(tm.year,tm.month,mdays) + datetime.timedelta(days=1)
+                continue
+            if day != tm.day:
+                tm = datetime.datetime(tm.year,tm.month,day)
+            
+            # 时
+            hour = _next_bit(self.hour,tm.hour,23)
+            if hour == None:
+                tm = datetime.datetime(tm.year,tm.month,tm.day) + datetime.timedelta(days=1)
+                continue
+            if hour != tm.hour:
+                tm = tm.replace(hour=hour,minute=0,second=0)
+            
+            # 分
+            minute = _next_bit(self.minute,tm.minute,59)
+            if minute == None:
+                tm = tm.replace(minute=0,second=0) + datetime.timedelta(hours=1)
+                continue
+            if minute != tm.minute:
+                tm = tm.replace(minute=minute,second=0)
+            
+            # 秒
+            second = _next_bit(self.second,tm.second,59)
+            if second == None:
+                tm = tm.replace(second=0) + datetime.timedelta(minutes=1)
+                continue
+            
+            # 夏令时开始时跳过的时间不执行
+            tm = tm.replace(second=second)
+            if not _exists(tm,tzinfo):
+                tm = tm + _ONE_SECOND
+                continue
+            return _attach_tz(tm,tzinfo)
+        
+        return None
+    
+    def prev_fire_time(self,before:datetime.datetime=None):
+        """
+        获取指定时间之前(不含)的上一次执行时间
+        
+        :param before: datetime 截止时间,默认当前时间
+        :return: datetime|None 永不执行时返回 None
+        """
+        if self.never():
+            return None
+        
+        if not before:
+            before = TaskClock.Now()
+        tzinfo = before.tzinfo
+        tm = before.replace(tzinfo=None,fold=0)
+        if tm.microsecond:
+            tm = tm.replace(microsecond=0)
+        else:
+            tm = tm - _ONE_SECOND
+        tm = _unfold(tm,before,False)
+        limit = max(before.year - _SEARCH_YEARS,datetime.MINYEAR + 1)
+        
+        while tm.year >= limit:
+            # 年
+            year = _prev_bit(self.year,tm.year,limit)
+            if year == None:
+                return None
+            if year != tm.year:
+                tm = datetime.datetime(year,12,31,23,59,59)
+            
+            # 月
+            month = _prev_bit(self.month,tm.month,1)
+            if month == None:
+                tm = datetime.datetime(tm.year - 1,12,31,23,59,59)
+                continue
+            if month != tm.month:
+                tm = datetime.datetime(tm.year,month,calendar.monthrange(tm.year,month)[1],23,59,59)
+            
+            # 日 + 周
+            mdays = calendar.monthrange(tm.year,tm.month)[1]
+            day = tm.day
+            while day >= 1 and not self.__day_hit(tm.year,tm.month,day,mdays):
+                day -= 1
+            if day < 1:
+                tm = datetime.datetime(tm.year,tm.month,1) - _ONE_SECOND
+                continue
+            if day != tm.day:
+                tm = datetime.datetime(tm.year,tm.month,day,23,59,59)
+            
+            # 时
+            hour = _prev_bit(self.hour,tm.hour,0)
+            if hour == None:
+                tm = datetime.datetime(tm.year,tm.month,tm.day) - _ONE_SECOND
+                continue
+            if hour != tm.hour:
+                tm = tm.replace(hour=hour,minute=59,second=59)
+            
+            # 分
+            minute = _prev_bit(self.minute,tm.minute,0)
+            if minute == None:
+                tm = tm.replace(minute=0,second=0) - _ONE_SECOND
+                continue
+            if minute != tm.minute:
+                tm = tm.replace(minute=minute,second=59)
+            
+            # 秒
+            second = _prev_bit(self.second,tm.second,0)
+            if second == None:
+                tm = tm.replace(second=0) - _ONE_SECOND
+                continue
+            
+            # 夏令时开始时跳过的时间不执行
+            tm = tm.replace(second=second)
+            if not _exists(tm,tzinfo):
+                tm = tm - _ONE_SECOND
+                continue
+            return _attach_tz(tm,tzinfo)
+        
+        return None
+
+
+def IterFireStamps(crons:list,start:datetime.datetime,end:datetime.datetime):
+    """
+    按时间顺序合并遍历多个定时表达式在 [start,end) 内的执行时间戳
+    
+    按天推进:每个执行日为各表达式建立日内游标,用堆按 (零点起的秒数,下标) 归并产出,
+    内存只随表达式个数增长;所有表达式都不执行的日期用 next_fire_time 直接跳过。
+    不带时区的时间按 bdpyconsts.TIME_ZONE 解释
+    
+    :param crons: list[CompiledCron] 定时表达式列表
+    :param start: datetime 开始时间(含)
+    :param end: datetime 结束时间(不含)
+    :return: Generator[(int,int)] (秒级时间戳,表达式下标)
+    """
+    tz = TaskClock.Zone()
+    start = start.astimezone(tz) if start.tzinfo != None else _attach_tz(start,tz)
+    end = end.astimezone(tz) if end.tzinfo != None else _attach_tz(end,tz)
+    start_ts = start.timestamp()
+    end_ts = end.timestamp()
+    
+    day = datetime.datetime(start.year,start.month,start.day)
+    base = int(_attach_tz(day,tz).timestamp())
+    while base < end_ts:
+        tomorrow = day + datetime.timedelta(days=1)
+        next_base = int(_attach_tz(tomorrow,tz).timestamp())
+        # 当天有时区偏移变化(夏令时)时逐个换算
+        shift = next_base - base != 86400
+        # 跳过开始时间之前的执行时间,偏移变化的日期不能按差值换算
+        first = 0
+        if not shift:
+            first = min(max(math.ceil(start_ts - base),0),86400)
+        
+        cursors = [_tag_offsets(cron.iter_intraday(first),i) for i,cron in enumerate(crons) if cron.fires_on(day.year,day.month,day.day)]
+        
+        if cursors:
+            for offset,i in heapq.merge(*cursors):
+                if shift:
+                    # 跳过不存在的时间,重复的时间只取第一次
+                    tm = day + datetime.timedelta(seconds=offset)
+                    if not _exists(tm,tz):
+                        continue
+                    ts = int(_attach_tz(tm,tz).timestamp())
+                else:
+                    ts = base + offset
+                if ts < start_ts:
+                    continue
+                if ts >= end_ts:
+                    return
+                yield (ts,i)
+            day,base = tomorrow,next_base
+            continue
+        
+        # 当天都不执行,跳到最近的执行日
+        nearest = None
+        for cron in crons:
+            tm = cron.next_fire_time(after=_attach_tz(tomorrow,tz) - _ONE_SECOND)
+            if tm != None and (nearest == None or tm < nearest):
+                nearest = tm
+        if nearest == None:
+            return
+        day = datetime.datetime(nearest.year,nearest.month,nearest.day)
+        base = int(_attach_tz(day,tz).timestamp())
+
+
+def _tag_offsets(offsets,i:int):
+    """
+    为日内游标的每个执行时间附加表达式下标
+    
+    :param offsets: Generator[int] 零点起的秒数
+    :param i: int 表达式下标
+    :return: Generator[(int,int)]
+    """
+    for offset in offsets:
+        yield (offset,i)
+
+
+def SpreadOffset(key:str,window:float) -> float:
+    """
+    按 key 的稳定哈希在 [0,window) 内取一个固定偏移,用于错开同一时间执行的任务
+    
+    使用 crc32,不受 PYTHONHASHSEED 影响,同一 key 在不同进程和重启后偏移相同
+    
+    :param key: str 任务名称
+    :param window: float 窗口秒数
+    :return: float 偏移秒数,精确到毫秒
+    """
+    if not window or window <= 0:
+        return 0.0
+    return round(zlib.crc32(key.encode("utf-8")) / 0x100000000 * window,3)
+
+
+def StampToTime(ts:int,cache:dict=None) -> datetime.datetime:
+    """
+    时间戳转换为 bdpyconsts.TIME_ZONE 时间
+    
+    时区偏移只在整刻钟变化,按刻钟缓存转换结果,大量连续时间戳只需做加法
+    
+    :param ts: int 秒级时间戳
+    :param cache: dict 调用方持有的缓存 {刻钟:datetime}
+    :return: datetime
+    """
+    bucket = ts - ts % 900
+    if cache == None:
+        cache = {}
+    ref = cache.get(bucket)
+    if ref == None:
+        if len(cache) > 4096:
+            cache.clear()
+        ref = datetime.datetime.fromtimestamp(bucket,TaskClock.Zone())
+        cache[bucket] = ref
+    if ts == bucket:
+        return ref
+    return ref + datetime.timedelta(seconds=ts - bucket)
+
+
+def NormalizeCron(con:str) -> str:
+    """
+    规范化定时表达式,合并多余空白
+    
+    :param con: str 定时表达式
+    :return: str
+    """
+    return " ".join(con.split())
+
+
+def CompileCron(con:str) -> CompiledCron:
+    """
+    获取编译后的定时表达式
+    
+    按规范化表达式做 LRU 缓存,位掩码等价的表达式共享同一个对象
+    
+    :param con: str 定时表达式
+    :return: CompiledCron
+    """
+    key = NormalizeCron(con)
+    with _CRON_CACHE_LOCK:
+        cron = _CRON_CACHE.get(key)
+        if cron != None:
+            _CRON_CACHE.move_to_end(key)
+            _CRON_CACHE_STAT["hits"] += 1
+            return cron
+        
+        _CRON_CACHE_STAT["misses"] += 1
+        cron = CompiledCron(key)
+        signature = cron.signature()
+        shared = _CRON_INTERN.get(signature)
+        if shared != None:
+            _CRON_CACHE_STAT["shared"] += 1
+            cron = shared
+        else:
+            _CRON_INTERN[signature] = cron
+        
+        _CRON_CACHE[key] = cron
+        if len(_CRON_CACHE) > _CRON_CACHE_SIZE:
+            _CRON_CACHE.popitem(last=False)
+        return cron
+
+
+def CronCacheInfo() -> dict:
+    """
+    编译缓存和命中判断复用统计
+    
+    编译缓存的统计是精确的;match_hits/match_misses 在命中判断的热路径上不加锁更新,
+    多线程同时判断时可能少计,只用于观察复用比例
+    
+    :return: dict
+    """
+    with _CRON_CACHE_LOCK:
+        info = dict(_CRON_CACHE_STAT)
+        info["size"] = len(_CRON_CACHE)
+        info["schedules"] = len(_CRON_INTERN)
+    info["match_hits"] = CompiledCron.match_hits
+    info["match_misses"] = CompiledCron.match_misses
+    return info
+
 
 class CronUnit(metaclass=abc.ABCMeta):
     """
@@ -309,10 +1105,6 @@ class Year(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = None
         # 最小值
@@ -321,13 +1113,18 @@ class Year(CronUnit):
         self.__max = None
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.year
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -363,10 +1160,6 @@ class Month(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = 12
         # 最小值
@@ -375,13 +1168,18 @@ class Month(CronUnit):
         self.__max = 12
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.month
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -417,10 +1215,6 @@ class Day(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = None
         # 最小值
@@ -429,27 +1223,21 @@ class Day(CronUnit):
         self.__max = None
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.day
-        if self.__current in [1,3,5,7,8,10,12]:
-            self.__long = 31
-            self.__max = 31
-        elif self.__current in [4,6,9,11]:
-            self.__long = 30
-            self.__max = 30
-        else:
-            year = tm.year
-            if year % 4 == 0 or year % 100 == 0 or year % 400 == 0:
-                self.__long = 29
-                self.__max = 29
-            else:
-                self.__long = 28
-                self.__max = 28
+        # 按所在月份的天数确定范围
+        self.__long = calendar.monthrange(tm.year,tm.month)[1]
+        self.__max = self.__long
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -485,10 +1273,6 @@ class Week(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = 7
         # 最小值
@@ -497,13 +1281,18 @@ class Week(CronUnit):
         self.__max = 7
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.weekday() + 1
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -539,10 +1328,6 @@ class Hour(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = 24
         # 最小值
@@ -551,13 +1336,18 @@ class Hour(CronUnit):
         self.__max = 23
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.hour
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -593,10 +1383,6 @@ class Minute(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = 60
         # 最小值
@@ -605,13 +1391,18 @@ class Minute(CronUnit):
         self.__max = 59
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
-        self.__current = tm.hour
+        self.__current = tm.minute
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -647,10 +1438,6 @@ class Second(CronUnit):
         # 时间对象
         self.__time = None
         
-        # 初始化时间对象
-        if tm:
-            self.load(tm)
-        
         # 时间长度
         self.__long = 60
         # 最小值
@@ -659,13 +1446,18 @@ class Second(CronUnit):
         self.__max = 59
         # 当前值
         self.__current = None
+        
+        # 初始化时间对象
+        if tm:
+            self.load(tm)
     
     def load(self, tm: datetime.datetime):
         self.__time = tm
         self.__current = tm.second
     
     def parse(self, con: str):
-        self.__croner = Cron(con)
+        self.__croner = Cron()
+        self.__croner.load(con)
         self.__croner.parse(self.__min,self.__max)
     
     def long(self) -> int:
@@ -4,6 +4,8 @@ import abc
 class BaseTask(metaclass=abc.ABCMeta):
     # 任务运行模式 秒循环
     TASK_RUN_SECOND_LOOP = "SECOND_LOOP"
+    # 任务运行模式 毫秒循环,固定频率且按单调时钟对齐
+    TASK_RUN_MS_SECOND_LOOP = "MS_SECOND_LOOP"
     # 任务运行模式 时间表
     TASK_RUN_SCHEDULE = "SCHEDULE"
     # 单次运行任务
@@ -14,8 +16,55 @@ class BaseTask(metaclass=abc.ABCMeta):
     # 单次任务执行时间点前缀 TIME_2022-08-13 22:36:21
     SINGLE_TASK_RUN_TIME = "TIME_"
     
-    @abc.abstractmethod
+    # 循环方式 上一次执行结束后间隔 loop_sed 秒再执行
+    LOOP_FIXED_DELAY = "FIXED_DELAY"
+    # 循环方式 每 loop_sed 秒按固定频率执行
+    LOOP_FIXED_RATE = "FIXED_RATE"
+    
+    # 毫秒循环错过执行点的补偿方式 跳过错过的执行点,等下一个执行点
+    CATCHUP_SKIP = "SKIP"
+    # 毫秒循环错过执行点的补偿方式 立即补执行一次
+    CATCHUP_ONCE = "ONCE"
+    # 毫秒循环错过执行点的补偿方式 每个错过的执行点都补执行
+    CATCHUP_ALL = "ALL"
+    
+    # 定时任务错过执行时间的处理方式 只补执行最后一次
+    MISFIRE_FIRE_ONCE = "FIRE_ONCE"
+    # 定时任务错过执行时间的处理方式 每个错过的时间点都补执行,一次最多补执行 TaskTimer.MISFIRE_MAX_RUNS 次
+    MISFIRE_FIRE_ALL = "FIRE_ALL"
+    # 定时任务错过执行时间的处理方式 不补执行
+    MISFIRE_SKIP = "SKIP"
+    
+    # 执行方式 线程池
+    EXECUTOR_THREAD = "THREAD"
+    # 执行方式 进程池,用于 CPU 密集任务,任务类需可被 pickle
+    EXECUTOR_PROCESS = "PROCESS"
+    # 执行方式 事件循环
+    EXECUTOR_ASYNC = "ASYNC"
+    
+    # 并发达到上限时的处理方式 跳过本次执行
+    OVERLAP_SKIP = "SKIP"
+    # 并发达到上限时的处理方式 保留最新的一次,等正在执行的结束后执行
+    OVERLAP_QUEUE_ONE = "QUEUE_ONE"
+    # 并发达到上限时的处理方式 取消正在执行的,结束后执行本次
+    OVERLAP_CANCEL_PREVIOUS = "CANCEL_PREVIOUS"
+    
+    # 实例生命周期 每次执行创建新实例
+    LIFECYCLE_EXECUTION = "EXECUTION"
+    # 实例生命周期 每个工作线程复用一个实例,进程任务每个工作进程复用一个实例
+    LIFECYCLE_THREAD = "THREAD"
+    # 实例生命周期 所有执行共用一个实例,任务需自行保证并发安全
+    LIFECYCLE_SINGLETON = "SINGLETON"
+    
+    # 重试间隔 固定为 try_after
+    BACKOFF_FIXED = "FIXED"
+    # 重试间隔 try_after * 2^(n-1)
+    BACKOFF_EXPONENTIAL = "EXPONENTIAL"
+    # 重试间隔 在 [try_after,上一次间隔*3] 内随机,避免同时失败的任务同时重试
+    BACKOFF_DECORRELATED = "DECORRELATED"
+    
     @staticmethod
+    @abc.abstractmethod
     def run_type(self,) -> str:
         """
         返回任务定时类型
@@ -23,8 +72,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: str
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def shcd_con(self,) -> str:
         """
         返回遍历输出时间表达式
@@ -33,8 +82,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         """
         return None
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def loop_sed(self,) -> float:
         """
         返回秒循环的秒
@@ -43,16 +92,155 @@ class BaseTask(metaclass=abc.ABCMeta):
         """
         return None
     
-    @abc.abstractmethod
     @staticmethod
+    def loop_mode() -> str:
+        """
+        返回秒循环的方式
+        
+        :return: str LOOP_FIXED_DELAY|LOOP_FIXED_RATE
+        """
+        return BaseTask.LOOP_FIXED_DELAY
+    
+    @staticmethod
+    def loop_ms() -> int:
+        """
+        返回毫秒循环的间隔,为空时使用 loop_sed
+        
+        :return: int 毫秒
+        """
+        return None
+    
+    @staticmethod
+    def loop_catchup() -> str:
+        """
+        返回毫秒循环错过执行点时的补偿方式
+        
+        :return: str CATCHUP_SKIP|CATCHUP_ONCE|CATCHUP_ALL
+        """
+        return BaseTask.CATCHUP_SKIP
+    
+    @staticmethod
+    def misfire() -> str:
+        """
+        返回定时任务错过执行时间后的处理方式
+        
+        :return: str MISFIRE_FIRE_ONCE|MISFIRE_FIRE_ALL|MISFIRE_SKIP
+        """
+        return BaseTask.MISFIRE_FIRE_ONCE
+    
+    @staticmethod
+    def misfire_grace() -> float:
+        """
+        返回错过执行时间的宽限秒数,宽限内的延迟按正常执行处理
+        
+        :return: float
+        """
+        return 1.0
+    
+    @staticmethod
+    def spread() -> float:
+        """
+        返回定时任务错开执行的窗口秒数,为空时按表达式的时间点执行
+        
+        每次执行按任务名称的稳定哈希在 [0,spread) 内固定后移,执行频率不变
+        
+        :return: float
+        """
+        return None
+    
+    @staticmethod
+    def executor() -> str:
+        """
+        返回任务的执行方式,为空时 run/after 为协程的使用事件循环,否则使用线程池
+        
+        :return: str EXECUTOR_THREAD|EXECUTOR_PROCESS|EXECUTOR_ASYNC
+        """
+        return None
+    
+    @staticmethod
+    def priority() -> int:
+        """
+        返回执行优先级,数值越小越先执行,在线程池排队时生效
+        
+        :return: int
+        """
+        return 0
+    
+    @staticmethod
+    def pool_name() -> str:
+        """
+        返回执行所在的线程池名称,为空时使用默认线程池
+        
+        :return: str
+        """
+        return None
+    
+    @staticmethod
+    def max_instances() -> int:
+        """
+        返回同一任务同时执行的上限,为空时不限制
+        
+        :return: int
+        """
+        return None
+    
+    @staticmethod
+    def overlap() -> str:
+        """
+        返回并发达到上限时的处理方式
+        
+        线程任务无法强制中断,OVERLAP_CANCEL_PREVIOUS 设置正在运行的尝试的 cancel 标记,
+        run 需接受并检查 cancel 才能尽快结束,被取消的执行不再重试
+        
+        :return: str OVERLAP_SKIP|OVERLAP_QUEUE_ONE|OVERLAP_CANCEL_PREVIOUS
+        """
+        return BaseTask.OVERLAP_SKIP
+    
+    @staticmethod
+    def lifecycle() -> str:
+        """
+        返回任务实例的生命周期,复用的实例只在第一次执行前 setup
+        
+        :return: str LIFECYCLE_EXECUTION|LIFECYCLE_THREAD|LIFECYCLE_SINGLETON
+        """
+        return BaseTask.LIFECYCLE_EXECUTION
+    
+    @staticmethod
+    def backoff() -> str:
+        """
+        返回重试间隔的计算方式
+        
+        :return: str BACKOFF_FIXED|BACKOFF_EXPONENTIAL|BACKOFF_DECORRELATED
+        """
+        return BaseTask.BACKOFF_FIXED
+    
+    @staticmethod
+    def backoff_max() -> float:
+        """
+        返回重试间隔的上限秒数,为空时不限制
+        
+        :return: float
+        """
+        return None
+    
+    @staticmethod
+    def on_shed(reason:str):
+        """
+        一次执行因线程池队列已满被拒绝或丢弃时调用,饱和状态可通过 StatManager.saturated 查询
+        
+        :param reason: str 原因 REJECT_NEWEST|DROP_OLDEST_SAME_TASK|BLOCK
+        """
+    
+    @staticmethod
+    @abc.abstractmethod
     def single_tm(self,) -> str:
         """
         返回单次任务执行时间点
         """
         return None
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def name(self,) -> str:
         """
         任务名称或脚本名称
@@ -60,8 +248,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: str
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def alias(self,) -> str:
         """
         任务别名
@@ -69,8 +257,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: str
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def timeout(self,) -> float:
         """
         执行超时时间
@@ -78,8 +266,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: float 超时时间|0表示无上限
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def trytimes(self,) -> int:
         """
         失败重试次数
@@ -87,17 +275,17 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: int 重试次数|0代表不重试
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def try_after(self,) -> float:
         """
         返回重试时间间隔 
         
         :return: float
         """
-
-    @abc.abstractmethod
+    
     @staticmethod
+    @abc.abstractmethod
     def logsend(self,msg:str):
         """
         发送日志,内部自己实现的方式
@@ -105,8 +293,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return:
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def emails(self,)->list:
         """
         获取通知邮件列表
@@ -114,8 +302,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: list 通知邮件列表
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def logfile(self,)->str:
         """
         获取日志记录文件路径
@@ -123,8 +311,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         :return: str 日志文件路径
         """
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def logsuccess(self,) -> bool:
         """
         成功是否通知
@@ -133,8 +321,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         """
         return False
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def logfield(self,) -> bool:
         """
         失败是否通知
@@ -143,8 +331,8 @@ class BaseTask(metaclass=abc.ABCMeta):
         """
         return False
     
-    @abc.abstractmethod
     @staticmethod
+    @abc.abstractmethod
     def logabnormal(self,) -> bool:
         """
         异常是否通知
@@ -153,10 +341,27 @@ class BaseTask(metaclass=abc.ABCMeta):
         """
         return False
     
+    def setup(self,):
+        """
+        创建实例后、第一次 run 之前调用,用于建立连接、加载模型等
+        
+        抛出异常按本次执行失败处理,协程任务可以定义为协程函数
+        """
+    
+    def teardown(self,):
+        """
+        实例不再使用时调用:每次执行结束(LIFECYCLE_EXECUTION)、复用的实例执行出错或任务被移除
+        
+        协程任务可以定义为协程函数
+        """
+    
     def run(self,**kwargs) -> bool:
         """
         运行入口
         
+        线程任务声明了 cancel 参数或 **kwargs 时会传入 cancel: threading.Event,超时后被设置,
+        长时间运行的任务应定期检查并退出
+        
         :param kwargs: dict 字典参数
         :return: bool 是否执行成功
         """
@@ -0,0 +1,216 @@
+# 任务实例缓存
+import inspect,threading
+from TaskFactory import BaseTask
+
+
+class InstanceCache:
+    """
+    按任务的 lifecycle 保存已经 setup 的任务实例
+    
+    LIFECYCLE_THREAD 按 (任务名称,线程) 保存,LIFECYCLE_SINGLETON 按任务名称保存,
+    LIFECYCLE_EXECUTION 不保存。acquire/release 同步调用 setup 和 teardown,
+    setup 或 teardown 为协程时由调用方使用 get/put/finish 自行处理
+    
+    get/put 返回的实例计入使用次数,每次使用结束必须调用 finish 或 release。
+    出错、被替换或 drain 的实例不再复用,等最后一个使用者结束后才返回给调用方 teardown
+    """
+    
+    def __init__(self,):
+        # 已缓存的实例 {(任务名称,线程ID|None):(线程|None,实例)}
+        self.__items = {}
+        # 使用中的实例 {id(实例):[使用次数,是否不再复用]}
+        self.__using = {}
+        self.__lock = threading.Lock()
+    
+    def __key(self,task:BaseTask) -> tuple:
+        """
+        实例的缓存键,不缓存时为 None
+        
+        :param task: BaseTask 任务类
+        :return: tuple|None
+        """
+        lifecycle = task.lifecycle()
+        if lifecycle == BaseTask.LIFECYCLE_SINGLETON:
+            return (task.name(),None)
+        if lifecycle == BaseTask.LIFECYCLE_THREAD:
+            return (task.name(),threading.get_ident())
+        return None
+    
+    def get(self,task:BaseTask) -> BaseTask:
+        """
+        获取当前可复用的实例,并计入一次使用
+        
+        :param task: BaseTask 任务类
+        :return: BaseTask|None 没有时为 None
+        """
+        key = self.__key(task)
+        if key == None:
+            return None
+        with self.__lock:
+            item = self.__items.get(key)
+            # 线程ID会被新线程重用,只返回当前线程自己的实例
+            if item == None or (item[0] != None and item[0] is not threading.current_thread()):
+                return None
+            self.__use(item[1])
+            return item[1]
+    
+    def put(self,task:BaseTask,ins:BaseTask) -> tuple:
+        """
+        缓存一个已经 setup 的实例,已有实例时保留已有的,使用的实例计入一次使用
+        
+        :param task: BaseTask 任务类
+        :param ins: BaseTask 实例
+        :return: tuple (使用的实例,需要 teardown 的实例列表)
+                 列表包括竞争中未被保留的 ins 和所在线程已退出且没有在使用的实例
+        """
+        key = self.__key(task)
+        if key == None:
+            return (ins,[])
+        
+        thread = None
+        if key[1] != None:
+            thread = threading.current_thread()
+        with self.__lock:
+            item = self.__items.get(key)
+            if item != None and item[0] is thread:
+                self.__use(item[1])
+                return (item[1],[ins])
+            self.__items[key] = (thread,ins)
+            self.__use(ins)
+            # 新线程第一次执行时顺带清理已退出线程的实例
+            dead = []
+            if item != None:
+                dead += self.__retire(item[1])
+            if thread != None:
+                for k,(t,v) in list(self.__items.items()):
+                    if t != None and not t.is_alive():
+                        del self.__items[k]
+                        dead += self.__retire(v)
+        return (ins,dead)
+    
+    def __use(self,ins:BaseTask):
+        """
+        实例计入一次使用,需持有锁
+        
+        :param ins: BaseTask 实例
+        """
+        self.__using.setdefault(id(ins),[0,False])[0] += 1
+    
+    def __retire(self,ins:BaseTask) -> list:
+        """
+        实例不再复用,需持有锁
+        
+        :param ins: BaseTask 实例
+        :return: list 没有在使用时返回 [ins],否则等最后一个使用者结束
+        """
+        using = self.__using.get(id(ins))
+        if using == None:
+            return [ins]
+        using[1] = True
+        return []
+    
+    def discard(self,task:BaseTask,ins:BaseTask) -> list:
+        """
+        不再复用一个实例,例如执行出错后
+        
+        :param task: BaseTask 任务类
+        :param ins: BaseTask 实例
+        :return: list 是缓存中的实例且没有在使用时返回 [ins],调用方需要 teardown
+        """
+        key = self.__key(task)
+        if key == None:
+            return []
+        with self.__lock:
+            item = self.__items.get(key)
+            if item == None or item[1] is not ins:
+                return []
+            del self.__items[key]
+            return self.__retire(ins)
+    
+    def acquire(self,task:BaseTask) -> BaseTask:
+        """
+        获取可复用的实例,没有时创建并 setup
+        
+        :param task: BaseTask 任务类
+        :return: BaseTask
+        :raise: setup 抛出的异常
+        """
+        ins = self.get(task)
+        if ins != None:
+            return ins
+        
+        ins = object.__new__(task)
+        ins.setup()
+        ins,stale = self.put(task,ins)
+        Teardown(stale)
+        return ins
+    
+    def release(self,task:BaseTask,ins:BaseTask,failed:bool=False):
+        """
+        一次执行结束,不复用的实例执行 teardown
+        
+        :param task: BaseTask 任务类
+        :param ins: BaseTask 实例
+        :param failed: bool 执行是否抛出异常,复用的实例出错后不再复用
+        """
+        Teardown(self.finish(task=task,ins=ins,failed=failed))
+    
+    def finish(self,task:BaseTask,ins:BaseTask,failed:bool=False) -> list:
+        """
+        一次执行结束,返回不再复用且没有其他使用者、需要 teardown 的实例
+        
+        :param task: BaseTask 任务类
+        :param ins: BaseTask 实例
+        :param failed: bool 执行是否抛出异常
+        :return: list
+        """
+        key = self.__key(task)
+        if key == None:
+            return [ins]
+        with self.__lock:
+            item = self.__items.get(key)
+            if failed and item != None and item[1] is ins:
+                del self.__items[key]
+                self.__retire(ins)
+            
+            using = self.__using.get(id(ins))
+            # 不是由 get/put 取得的实例没有被缓存
+            if using == None:
+                return [ins]
+            using[0] -= 1
+            if using[0] > 0:
+                return []
+            del self.__using[id(ins)]
+            if using[1]:
+                return [ins]
+            return []
+    
+    def drain(self,name:str=None) -> list:
+        """
+        移除缓存的实例,使用中的实例在最后一个使用者结束时 teardown
+        
+        :param name: str 任务名称,为空时移除全部
+        :return: list 没有在使用、需要 teardown 的实例
+        """
+        with self.__lock:
+            keys = [k for k in self.__items if name == None or k[0] == name]
+            res = []
+            for k in keys:
+                res += self.__retire(self.__items.pop(k)[1])
+            return res
+
+
+def Teardown(instances:list):
+    """
+    依次调用实例的 teardown,忽略异常,不影响其他实例
+    
+    :param instances: list 实例列表
+    """
+    for ins in instances:
+        try:
+            res = ins.teardown()
+            # 协程 teardown 需要在事件循环中执行,这里无法等待
+            if inspect.iscoroutine(res):
+                res.close()
+        except Exception:
+            pass
@@ -0,0 +1,452 @@
+# 弹性线程池
+import collections,heapq,itertools,queue,threading,time
+from concurrent.futures import Executor,Future
+import TaskClock
+
+
+class _WorkItem:
+    """
+    一次提交的执行
+    """
+    __slots__ = ("future","fn","args","kwargs","enqueued","key","on_shed")
+    
+    def __init__(self,future:Future,fn,args:tuple,kwargs:dict,key=None,on_shed=None):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # 入队时间(纳秒),用于计算排队等待
+        self.enqueued = TaskClock.PerfNs()
+        # 所属任务,用于丢弃同一任务最早的排队
+        self.key = key
+        # 被丢弃时的回调
+        self.on_shed = on_shed
+    
+    def run(self,):
+        """
+        执行并设置 Future 的结果
+        """
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args,**self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class _PriorityQueue:
+    """
+    按 (键,序号) 出队的阻塞队列
+    """
+    
+    def __init__(self,):
+        # 最小堆 (键,序号,条目)
+        self.__heap = []
+        # 插入序号,相同键按插入顺序出队
+        self.__seq = itertools.count()
+        self.__lock = threading.Lock()
+        self.__cond = threading.Condition(self.__lock)
+        self.__not_full = threading.Condition(self.__lock)
+    
+    def put(self,key:float,item,maxsize:int=0,timeout:float=0):
+        """
+        加入一个条目
+        
+        :param key: float 排序键
+        :param item: 条目
+        :param maxsize: int 队列上限,0 不限制
+        :param timeout: float 队列已满时等待的秒数
+        :raise: queue.Full 等待后仍然已满
+        """
+        with self.__cond:
+            if maxsize and len(self.__heap) >= maxsize:
+                end = time.monotonic() + timeout
+                while len(self.__heap) >= maxsize:
+                    left = end - time.monotonic()
+                    if left <= 0:
+                        raise queue.Full
+                    self.__not_full.wait(left)
+            heapq.heappush(self.__heap,(key,next(self.__seq),item))
+            self.__cond.notify()
+    
+    def put_replace(self,key:float,item,maxsize:int,match):
+        """
+        加入一个条目,队列已满时替换掉满足 match 的最早条目
+        
+        :param key: float 排序键
+        :param item: 条目
+        :param maxsize: int 队列上限
+        :param match: callable 判断条目是否可以被替换
+        :return: 被替换的条目,未替换时为 None
+        :raise: queue.Full 已满且没有可替换的条目
+        """
+        with self.__cond:
+            dropped = None
+            if len(self.__heap) >= maxsize:
+                index = None
+                for i,node in enumerate(self.__heap):
+                    if match(node[2]) and (index == None or node[2].enqueued < self.__heap[index][2].enqueued):
+                        index = i
+                if index == None:
+                    raise queue.Full
+                dropped = self.__heap[index][2]
+                self.__heap[index] = self.__heap[-1]
+                self.__heap.pop()
+                heapq.heapify(self.__heap)
+            heapq.heappush(self.__heap,(key,next(self.__seq),item))
+            self.__cond.notify()
+            return dropped
+    
+    def get(self,timeout:float=None):
+        """
+        取出键最小的条目
+        
+        :param timeout: float 等待秒数,为空时一直等待
+        :return: 条目
+        :raise: queue.Empty 超时
+        """
+        with self.__cond:
+            if timeout != None:
+                end = time.monotonic() + timeout
+            while not self.__heap:
+                if timeout == None:
+                    self.__cond.wait()
+                    continue
+                left = end - time.monotonic()
+                if left <= 0:
+                    raise queue.Empty
+                self.__cond.wait(left)
+            self.__not_full.notify()
+            return heapq.heappop(self.__heap)[2]
+    
+    def get_nowait(self,):
+        return self.get(timeout=0)
+    
+    def qsize(self,) -> int:
+        return len(self.__heap)
+    
+    def empty(self,) -> bool:
+        return not self.__heap
+
+
+class TaskPool(Executor):
+    """
+    按排队等待和占用情况在 [min_workers,max_workers] 之间伸缩的线程池
+    
+    提交时没有空闲线程则扩容一个;线程取到任务时发现排队超过 target_wait 且仍有积压,再扩容一个。
+    空闲超过 keep_alive 秒的线程退出,直到剩下 min_workers 个
+    
+    队列按 入队时间 + 优先级 * aging 排序,数值越小越先执行;
+    低优先级的执行每多等待 aging 秒相当于提升一级,不会被持续到来的高优先级执行饿死
+    
+    设置 max_queue 后 dispatch 的排队数有上限,队列已满时按 shed 处理新的执行;
+    submit 是 Executor 接口(例如事件循环的 run_in_executor),不受上限限制,不会阻塞或被拒绝
+    """
+    
+    # 队列已满 拒绝新的执行
+    SHED_REJECT_NEWEST = "REJECT_NEWEST"
+    # 队列已满 丢弃同一任务最早的排队执行,没有时拒绝新的执行
+    SHED_DROP_OLDEST_SAME_TASK = "DROP_OLDEST_SAME_TASK"
+    # 队列已满 阻塞提交方最多 block_timeout 秒,仍然已满时拒绝
+    SHED_BLOCK = "BLOCK"
+    
+    # 排队数达到上限的该比例时视为饱和
+    SATURATION_HIGH = 0.8
+    
+    def __init__(self,min_workers:int,max_workers:int,keep_alive:float=60.0,target_wait:float=0.05,name:str="TaskPool",aging:float=1.0,
+                 max_queue:int=0,shed:str=SHED_REJECT_NEWEST,block_timeout:float=1.0):
+        """
+        :param min_workers: int 最少线程数
+        :param max_workers: int 最多线程数
+        :param keep_alive: float 超过最少线程数的空闲线程保留秒数
+        :param target_wait: float 排队等待超过该秒数时扩容
+        :param name: str 线程名前缀
+        :param aging: float 每级优先级相当于的等待秒数
+        :param max_queue: int 排队上限,0 不限制
+        :param shed: str 队列已满时的处理方式 SHED_REJECT_NEWEST|SHED_DROP_OLDEST_SAME_TASK|SHED_BLOCK
+        :param block_timeout: float SHED_BLOCK 最多阻塞的秒数
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be greater than 0")
+        
+        self.min_workers = max(min(min_workers,max_workers),0)
+        self.max_workers = max_workers
+        self.keep_alive = keep_alive
+        self.target_wait = target_wait
+        self.name = name
+        self.aging = aging
+        self.max_queue = max_queue
+        self.shed = shed
+        self.block_timeout = block_timeout
+        
+        # 待执行队列
+        self.__queue = _PriorityQueue()
+        # 空闲线程数,提交时占用一个空闲线程
+        self.__idle = threading.Semaphore(0)
+        self.__lock = threading.Lock()
+        # 当前线程数
+        self.__size = 0
+        # 线程数峰值
+        self.__peak = 0
+        # 扩容次数
+        self.__grow = 0
+        # 缩容次数
+        self.__shrink = 0
+        # 因队列已满被拒绝或丢弃的执行数
+        self.__shed = 0
+        # 排队等待的指数移动平均(秒)
+        self.__wait_avg = 0.0
+        # 排队等待的最大值(秒)
+        self.__wait_max = 0.0
+        # 最近的伸缩事件
+        self.__events = collections.deque(maxlen=100)
+        # 工作线程
+        self.__threads = set()
+        self.__shutdown = False
+        self.__seq = 0
+        
+        for _ in range(self.min_workers):
+            self.__spawn("min")
+    
+    def submit(self,fn,*args,**kwargs) -> Future:
+        """
+        按默认优先级 0 提交一次执行
+        
+        :param fn: callable 执行函数
+        :return: Future
+        """
+        return self.submit_priority(0,fn,*args,**kwargs)
+    
+    def submit_priority(self,priority:int,fn,*args,**kwargs) -> Future:
+        """
+        按优先级提交一次执行,不受队列上限限制
+        
+        :param priority: int 优先级,数值越小越优先
+        :param fn: callable 执行函数
+        :return: Future
+        """
+        return self.__put(_WorkItem(Future(),fn,args,kwargs),priority,admit=False)
+    
+    def dispatch(self,key,priority:int,fn,kwargs:dict,on_shed=None) -> Future:
+        """
+        提交一个任务的执行,队列已满被拒绝或之后被丢弃时调用 on_shed
+        
+        :param key: 所属任务
+        :param priority: int 优先级,数值越小越优先
+        :param fn: callable 执行函数
+        :param kwargs: dict 执行参数
+        :param on_shed: callable on_shed(原因) 原因为 SHED_REJECT_NEWEST|SHED_DROP_OLDEST_SAME_TASK|SHED_BLOCK
+        :return: Future|None 被拒绝时为 None
+        """
+        return self.__put(_WorkItem(Future(),fn,(),kwargs,key=key,on_shed=on_shed),priority)
+    
+    def saturation(self,) -> float:
+        """
+        排队数占上限的比例,不限制时为 0
+        
+        :return: float
+        """
+        if not self.max_queue:
+            return 0.0
+        return min(self.__queue.qsize() / self.max_queue,1.0)
+    
+    def __put(self,item:_WorkItem,priority:int,admit:bool=True) -> Future:
+        """
+        按队列上限和 shed 加入队列
+        
+        :param item: _WorkItem 执行
+        :param priority: int 优先级
+        :param admit: bool 是否按队列上限和 shed 处理
+        :return: Future|None 被拒绝时为 None
+        """
+        with self.__lock:
+            if self.__shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+        
+        sort = item.enqueued / 1e9 + priority * self.aging
+        dropped = None
+        try:
+            if not self.max_queue or not admit:
+                self.__queue.put(sort,item)
+            elif self.shed == self.SHED_BLOCK:
+                self.__queue.put(sort,item,maxsize=self.max_queue,timeout=self.block_timeout)
+            elif self.shed == self.SHED_DROP_OLDEST_SAME_TASK and item.key != None:
+                dropped = self.__queue.put_replace(sort,item,self.max_queue,lambda it: it != None and it.key == item.key)
+            else:
+                self.__queue.put(sort,item,maxsize=self.max_queue)
+        except queue.Full:
+            self.__shed_item(item,self.shed)
+            return None
+        
+        if dropped != None:
+            dropped.future.cancel()
+            self.__shed_item(dropped,self.SHED_DROP_OLDEST_SAME_TASK)
+        elif not self.__idle.acquire(blocking=False):
+            self.__spawn("busy")
+        return item.future
+    
+    def __shed_item(self,item:_WorkItem,reason:str):
+        """
+        记录并通知一次被拒绝或丢弃的执行
+        
+        :param item: _WorkItem 执行
+        :param reason: str 原因
+        """
+        with self.__lock:
+            self.__shed += 1
+        if item.on_shed != None:
+            item.on_shed(reason)
+    
+    def shutdown(self,wait:bool=True,*,cancel_futures:bool=False):
+        """
+        关闭线程池
+        
+        :param wait: bool 是否等待线程退出
+        :param cancel_futures: bool 是否取消还在排队的执行
+        """
+        with self.__lock:
+            self.__shutdown = True
+            size = self.__size
+            threads = list(self.__threads)
+        
+        if cancel_futures:
+            while True:
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item != None:
+                    item.future.cancel()
+        
+        # 排在所有执行之后
+        for _ in range(size):
+            self.__queue.put(float("inf"),None)
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+    
+    def size(self,) -> int:
+        """
+        当前线程数
+        
+        :return: int
+        """
+        return self.__size
+    
+    def events(self,) -> list:
+        """
+        最近的伸缩事件
+        
+        :return: list [{"at":时间,"event":grow|shrink,"size":伸缩后线程数,"reason":原因}]
+        """
+        with self.__lock:
+            return list(self.__events)
+    
+    def stats(self,) -> dict:
+        """
+        线程池状态
+        
+        :return: dict
+        """
+        with self.__lock:
+            return {
+                "size":self.__size,
+                "min":self.min_workers,
+                "max":self.max_workers,
+                "peak":self.__peak,
+                "queued":self.__queue.qsize(),
+                "wait_avg":self.__wait_avg,
+                "wait_max":self.__wait_max,
+                "grow":self.__grow,
+                "shrink":self.__shrink,
+                "max_queue":self.max_queue,
+                "shed":self.__shed,
+                "saturation":self.saturation(),
+            }
+    
+    def describe(self,) -> str:
+        """
+        线程池状态描述
+        
+        :return: str
+        """
+        st = self.stats()
+        return """
+pool   %s  |  %d - %d
+tab    size | peak | queued | max_queue | saturation | wait_avg_ms | wait_max_ms | grow | shrink | shed
+       %d  --  %d  --  %d  --  %d  --  %.2f  --  %.3f  --  %.3f  --  %d  --  %d  --  %d
+    """ % (self.name,st["min"],st["max"],st["size"],st["peak"],st["queued"],st["max_queue"],st["saturation"],st["wait_avg"] * 1000,st["wait_max"] * 1000,st["grow"],st["shrink"],st["shed"])
+    
+    def __spawn(self,reason:str):
+        """
+        扩容一个线程,已达上限时不处理
+        
+        :param reason: str 扩容原因 min|busy|wait
+        """
+        with self.__lock:
+            if self.__shutdown or self.__size >= self.max_workers:
+                return
+            self.__size += 1
+            self.__seq += 1
+            self.__peak = max(self.__peak,self.__size)
+            if reason != "min":
+                self.__grow += 1
+                self.__events.append({"at":TaskClock.Now(),"event":"grow","size":self.__size,"reason":reason})
+            thread = threading.Thread(target=self.__work,name="%s_%d" % (self.name,self.__seq),daemon=True)
+            self.__threads.add(thread)
+        thread.start()
+    
+    def __retire(self,) -> bool:
+        """
+        空闲超时的线程退出,保留 min_workers 个
+        
+        :return: bool 是否退出
+        """
+        with self.__lock:
+            if self.__size <= self.min_workers:
+                return False
+            self.__size -= 1
+            self.__threads.discard(threading.current_thread())
+            self.__shrink += 1
+            self.__events.append({"at":TaskClock.Now(),"event":"shrink","size":self.__size,"reason":"idle"})
+            return True
+    
+    def __work(self,):
+        """
+        工作线程
+        """
+        self.__idle.release()
+        while True:
+            # 保留的线程不会退出,一直阻塞等待,空闲时不唤醒
+            timeout = self.keep_alive
+            if self.__size <= self.min_workers:
+                timeout = None
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                # 拿回自己的空闲名额才能退出,名额已被占用说明有执行正在提交
+                if self.__idle.acquire(blocking=False):
+                    if self.__retire():
+                        return
+                    self.__idle.release()
+                continue
+            
+            if item == None:
+                with self.__lock:
+                    self.__size -= 1
+                    self.__threads.discard(threading.current_thread())
+                return
+            
+            wait = (TaskClock.PerfNs() - item.enqueued) / 1e9
+            self.__wait_avg = self.__wait_avg * 0.9 + wait * 0.1
+            if wait > self.__wait_max:
+                self.__wait_max = wait
+            if wait > self.target_wait and not self.__queue.empty():
+                self.__spawn("wait")
+            
+            item.run()
+            del item
+            self.__idle.release()
@@ -0,0 +1,251 @@
+# 截止时间调度结构
+import heapq,itertools,time
+
+
+class HeapScheduler:
+    """
+    最小堆截止时间调度器
+    
+    按 (截止时间,序号) 排序保存待执行条目,只弹出已到期的条目。
+    自身不加锁,由 TaskTimer 在条件变量内调用
+    """
+    
+    def __init__(self,):
+        # 最小堆 [截止时间,序号,键,条目]
+        self.__heap = []
+        # 有效条目 {键:堆节点}
+        self.__entries = {}
+        # 插入序号,保证同一截止时间按插入顺序弹出
+        self.__seq = itertools.count()
+    
+    def __len__(self,) -> int:
+        return len(self.__entries)
+    
+    def __contains__(self,key) -> bool:
+        return key in self.__entries
+    
+    def push(self,key,deadline:float,item):
+        """
+        添加或替换一个条目
+        
+        :param key: 条目键,同一个键只保留最后一次添加
+        :param deadline: float 截止时间戳(秒)
+        :param item: 条目内容
+        """
+        self.cancel(key)
+        node = [deadline,next(self.__seq),key,item,True]
+        self.__entries[key] = node
+        heapq.heappush(self.__heap,node)
+    
+    def cancel(self,key) -> bool:
+        """
+        取消一个条目,堆节点延迟到弹出时丢弃
+        
+        :param key: 条目键
+        :return: bool 是否存在该条目
+        """
+        node = self.__entries.pop(key,None)
+        if node == None:
+            return False
+        node[4] = False
+        return True
+    
+    def next_deadline(self,):
+        """
+        获取最近的截止时间
+        
+        :return: float|None 没有条目时返回 None
+        """
+        heap = self.__heap
+        while heap and not heap[0][4]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return heap[0][0]
+    
+    def pop_due(self,now:float) -> list:
+        """
+        弹出所有已到期的条目
+        
+        :param now: float 当前时间戳(秒)
+        :return: list [(截止时间,键,条目)]
+        """
+        due = []
+        heap = self.__heap
+        while heap and heap[0][0] <= now:
+            deadline,_,key,item,alive = heapq.heappop(heap)
+            if not alive:
+                continue
+            del self.__entries[key]
+            due.append((deadline,key,item))
+        return due
+
+
+class WheelScheduler:
+    """
+    分层时间轮截止时间调度器
+    
+    秒/分/时/天 四层时间轮,插入和取消都是 O(1),
+    高层时间轮转到对应槽位时把条目逐层下放到低层时间轮。
+    超出天轮范围的条目暂存在溢出表里,每天整点重新下放。
+    自身不加锁,由 TaskTimer 在条件变量内调用
+    """
+    
+    # 每层时间轮每格跨度(单位 刻度)
+    SPANS = (1,60,3600,86400)
+    # 每层时间轮格数
+    SIZES = (60,60,24,366)
+    
+    def __init__(self,tick:float=1.0,start:float=None):
+        """
+        初始化时间轮
+        
+        :param tick: float 刻度长度(秒)
+        :param start: float 起始时间戳,默认当前时间
+        """
+        if start == None:
+            start = time.time()
+        # 刻度长度
+        self.__tick = tick
+        # 当前刻度
+        self.__current = int(start // tick)
+        # 各层时间轮 [[{键:节点}]]
+        self.__wheels = [[{} for _ in range(size)] for size in self.SIZES]
+        # 溢出表 {键:节点}
+        self.__overflow = {}
+        # 有效条目 {键:节点}
+        self.__entries = {}
+    
+    def __len__(self,) -> int:
+        return len(self.__entries)
+    
+    def __contains__(self,key) -> bool:
+        return key in self.__entries
+    
+    def __place(self,node:list):
+        """
+        按截止时间把节点放入对应层的槽位
+        
+        :param node: list [截止时间,键,条目,所在槽位]
+        """
+        current = self.__current
+        at = max(int(node[0] // self.__tick),current)
+        
+        slot = self.__overflow
+        for level in range(len(self.SPANS)):
+            span = self.SPANS[level]
+            size = self.SIZES[level]
+            if at // span - current // span < size:
+                slot = self.__wheels[level][(at // span) % size]
+                break
+        
+        slot[node[1]] = node
+        node[3] = slot
+    
+    def __cascade(self,):
+        """
+        当前刻度跨过高层时间轮的格子边界时,把该格条目下放
+        """
+        current = self.__current
+        for level in range(len(self.SPANS) - 1,0,-1):
+            span = self.SPANS[level]
+            if current % span:
+                continue
+            slot = self.__wheels[level][(current // span) % self.SIZES[level]]
+            nodes = list(slot.values())
+            slot.clear()
+            # 天轮边界同时检查溢出表
+            if level == len(self.SPANS) - 1:
+                nodes.extend(self.__overflow.values())
+                self.__overflow.clear()
+            for node in nodes:
+                self.__place(node)
+    
+    def push(self,key,deadline:float,item):
+        """
+        添加或替换一个条目
+        
+        :param key: 条目键,同一个键只保留最后一次添加
+        :param deadline: float 截止时间戳(秒)
+        :param item: 条目内容
+        """
+        self.cancel(key)
+        node = [deadline,key,item,None]
+        self.__entries[key] = node
+        self.__place(node)
+    
+    def cancel(self,key) -> bool:
+        """
+        取消一个条目
+        
+        :param key: 条目键
+        :return: bool 是否存在该条目
+        """
+        node = self.__entries.pop(key,None)
+        if node == None:
+            return False
+        del node[3][key]
+        return True
+    
+    def next_deadline(self,):
+        """
+        获取最近的截止时间
+        
+        秒轮内返回精确时间,更高层返回该格的起始时间,
+        到时下放后再精确计算
+        
+        :return: float|None 没有条目时返回 None
+        """
+        if not self.__entries:
+            return None
+        
+        current = self.__current
+        nearest = None
+        seconds = self.__wheels[0]
+        for i in range(self.SIZES[0]):
+            slot = seconds[(current + i) % self.SIZES[0]]
+            if slot:
+                nearest = min(node[0] for node in slot.values())
+                break
+        
+        # 高层条目可能早于低层条目,每层取最近非空格的起始时间
+        for level in range(1,len(self.SPANS)):
+            span = self.SPANS[level]
+            size = self.SIZES[level]
+            base = current // span
+            for i in range(1,size):
+                if self.__wheels[level][(base + i) % size]:
+                    at = (base + i) * span * self.__tick
+                    if nearest == None or at < nearest:
+                        nearest = at
+                    break
+        
+        if self.__overflow:
+            day = self.SPANS[-1]
+            at = (current // day + 1) * day * self.__tick
+            if nearest == None or at < nearest:
+                nearest = at
+        
+        return nearest
+    
+    def pop_due(self,now:float) -> list:
+        """
+        推进时间轮并弹出所有已到期的条目
+        
+        :param now: float 当前时间戳(秒)
+        :return: list [(截止时间,键,条目)]
+        """
+        due = []
+        target = int(now // self.__tick)
+        seconds = self.__wheels[0]
+        while True:
+            slot = seconds[self.__current % self.SIZES[0]]
+            for key in [key for key,node in slot.items() if node[0] <= now]:
+                node = slot.pop(key)
+                del self.__entries[key]
+                due.append((node[0],key,node[2]))
+            if self.__current >= target:
+                break
+            self.__current += 1
+            self.__cascade()
+        return due
@@ -1,8 +1,8 @@
 from ast import Try
 from asyncio import Task
-import datetime,pytz
+import datetime,threading
 from TaskFactory import BaseTask
-from bdpyconsts import bdpyconsts
+import TaskClock
 
 class StatManager:
     # 全局状态统计
@@ -23,22 +23,41 @@ class StatManager:
     last_run_success = ""
     # 最后一次执行错误信息
     last_run_msg = ""
+    # 错过的执行点总数
+    missed_times = 0
+    # 延迟处理的心跳数
+    missed_ticks = 0
+    # 因并发上限跳过的执行总数
+    skipped_times = 0
+    # 超时总数
+    timeout_times = 0
+    # 超时后仍未退出的线程数
+    stuck_threads = 0
+    # 因队列已满被拒绝或丢弃的执行总数
+    shed_times = 0
+    # 各线程池最近一次提交时的排队饱和度 {线程池名称:排队数/排队上限}
+    saturation = {}
+    # 饱和度达到该值视为饱和
+    SATURATION_HIGH = 0.8
+    # 统计锁,各工作线程同时更新计数
+    __lock = threading.Lock()
     
     def __new__(cls,task:BaseTask):
         # 启动时间
         if not cls.start_at:
-            cls.start_at = datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE))
+            cls.start_at = TaskClock.Now()
         
         # 实例化主状态管理器
-        if not Task:
+        if task == None:
             return object.__new__(cls)
-
+        
         # 实例化状态管理器
         name = task.name()
-        if name not in cls.task_stats:
-            cls.task_stats[name] = object.__new__(cls)
-            cls.task_count += 1
-        return cls.task_stats[name]
+        with cls.__lock:
+            if name not in cls.task_stats:
+                cls.task_stats[name] = object.__new__(cls)
+                cls.task_count += 1
+            return cls.task_stats[name]
     
     def __init__(self,task:BaseTask):
         """
@@ -46,6 +65,10 @@ class StatManager:
         
         :param task: BaseTask 任务类
         """
+        # 每个任务的状态管理器只初始化一次,避免清空统计
+        if hasattr(self,"_StatManager__master"):
+            return
+        
         # 是否是主状态管理器
         if task == None:
             self.__master = True
@@ -80,10 +103,24 @@ class StatManager:
         self.success_rate = 1.0
         # 最后一次执行时间
         self.last_at = None
+        # 平均调度抖动(秒)
+        self.jitter_avg = 0.0
+        # 最大调度抖动(秒)
+        self.jitter_max = 0.0
+        # 抖动统计次数
+        self.jitter_count = 0
+        # 错过的执行点数
+        self.missed = 0
+        # 因并发上限跳过的执行数
+        self.skipped = 0
+        # 超时次数
+        self.timeouts = 0
+        # 因队列已满被拒绝或丢弃的执行数
+        self.shed = 0
         # 运行记录
         self.run_list = []
     
-    def stat(self,success:bool,st:datetime.datetime,ed:datetime.datetime,mem:int,cpu:float,rety:bool,msg:str):
+    def stat(self,success:bool,st:datetime.datetime,ed:datetime.datetime,mem:int,cpu:float,rety:bool,msg:str,cost:float=None):
         """
         执行结果统计
         
@@ -94,68 +131,181 @@ class StatManager:
         :param cpu: 暂用cpu float
         :param rety: bool 是否属于重试
         :param msg: str 错误信息
+        :param cost: float 单调时钟测得的耗时(秒),为空时按 ed - st 计算
         """
         if self.__master == True:
             return
         
-        # 类统计
-        StatManager.run_times += 1
-        StatManager.last_run_at = ed
-        StatManager.last_run_task = self.name
+        with StatManager.__lock:
+            # 类统计
+            StatManager.run_times += 1
+            StatManager.last_run_at = ed
+            StatManager.last_run_task = self.name
+            
+            # 对象统计
+            self.count += 1
+            self.last_at = ed
+            
+            # 成功记录
+            if success:
+                self.success += 1
+                StatManager.success_times += 1
+                StatManager.last_run_success = True
+            else:
+                StatManager.last_run_success = False
+            
+            # 成功率计算
+            self.success_rate = round(self.success / self.count,2)
+            
+            # 平均耗时计算
+            if cost == None:
+                tmcost = ed.timestamp() - st.timestamp()
+            else:
+                tmcost = cost
+            tmcost = round(tmcost,3)
+            self.tm_avg = round((self.tm_avg * (self.count - 1) + tmcost) / self.count,3)
+            
+            if tmcost > self.tm_max:
+                self.tm_max = tmcost
+            
+            # 内存消耗率计算
+            self.mem_avg = int((self.mem_avg * (self.count - 1) + mem) / self.count)
+            if mem > self.mem_max:
+                self.mem_max = mem
+            
+            # cpu 消耗率计算
+            self.cpu_avg = round((self.cpu_avg * (self.count - 1) + cpu) / self.count,2)
+            if cpu > self.cpu_max:
+                self.cpu_max = cpu
+            
+            # 重试统计
+            if rety:
+                self.rety += 1
+            
+            # 添加运行记录
+            if len(self.run_list) > 10:
+                self.run_list = self.run_list[0:9]
+            self.run_list.append({
+                "name":self.name,
+                "alias":self.alias,
+                "retry":rety,
+                "st":st,
+                "ed":ed,
+                "tmcost":tmcost,
+                "mem":mem,
+                "cpu":cpu,
+                "success":success,
+                "msg":msg
+            })
+    
+    def stat_jitter(self,jitter:float):
+        """
+        调度抖动统计,实际开始时间与计划执行点的差
         
-        # 对象统计
-        self.count += 1
-        self.last_at = ed
+        :param jitter: float 抖动(秒)
+        """
+        if self.__master == True:
+            return
         
-        # 成功记录
-        if success:
-            self.success += 1
-            StatManager.success_times += 1
-            StatManager.last_run_success = True
-        else:
-            StatManager.last_run_success = False
-        
-        # 成功率计算
-        self.success_rate = round(self.success / self.count,2)
-        
-        # 平均耗时计算
-        stmp = st.timestamp()
-        edtmp = ed.timestamp()
-        tmcost = int(edtmp - stmp)
-        self.tm_avg = int((self.tm_avg * (self.count - 1) + tmcost) / self.count)
-        
-        if tmcost > self.tm_max:
-            self.tm_max = tmcost
-        
-        # 内存消耗率计算
-        self.mem_avg = int((self.mem_avg * (self.count - 1) + mem) / self.count)
-        if mem > self.mem_max:
-            self.mem_max = mem
-        
-        # cpu 消耗率计算
-        self.cpu_avg = round((self.cpu_avg * (self.count - 1) + cpu) / self.count,2)
-        if cpu > self.cpu_max:
-            self.cpu_max = cpu
-        
-        # 重试统计
-        if rety:
-            self.rety += 1
-        
-        # 添加运行记录
-        if len(self.run_list) > 10:
-            self.run_list = self.run_list[0:9]
-        self.run_list.append({
-            "name":self.name,
-            "alias":self.alias,
-            "retry":rety,
-            "st":st,
-            "ed":ed,
-            "tmcost":tmcost,
-            "mem":mem,
-            "cpu":cpu,
-            "success":success,
-            "msg":msg
-        })
+        with StatManager.__lock:
+            self.jitter_count += 1
+            self.jitter_avg = (self.jitter_avg * (self.jitter_count - 1) + jitter) / self.jitter_count
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+    
+    def stat_missed(self,count:int=1):
+        """
+        错过的执行点统计
+        
+        :param count: int 错过的执行点数
+        """
+        if self.__master == True:
+            return
+        
+        with StatManager.__lock:
+            self.missed += count
+            StatManager.missed_times += count
+    
+    def stat_skipped(self,count:int=1):
+        """
+        因并发上限跳过的执行统计
+        
+        :param count: int 跳过的执行数
+        """
+        if self.__master == True:
+            return
+        
+        with StatManager.__lock:
+            self.skipped += count
+            StatManager.skipped_times += count
+    
+    def stat_timeout(self,stuck:bool=False):
+        """
+        超时统计
+        
+        :param stuck: bool 是否留下了仍在运行的线程
+        """
+        if self.__master == True:
+            return
+        
+        with StatManager.__lock:
+            self.timeouts += 1
+            StatManager.timeout_times += 1
+            if stuck:
+                StatManager.stuck_threads += 1
+    
+    def stat_shed(self,count:int=1):
+        """
+        因队列已满被拒绝或丢弃的执行统计
+        
+        :param count: int 执行数
+        """
+        if self.__master == True:
+            return
+        
+        with StatManager.__lock:
+            self.shed += count
+            StatManager.shed_times += count
+    
+    @classmethod
+    def stat_saturation(cls,pool:str,ratio:float):
+        """
+        线程池排队饱和度统计
+        
+        :param pool: str 线程池名称
+        :param ratio: float 排队数/排队上限
+        """
+        cls.saturation[pool] = ratio
+    
+    @classmethod
+    def saturated(cls,pool:str=None) -> bool:
+        """
+        线程池是否饱和,任务可据此主动降低负载
+        
+        :param pool: str 线程池名称,为空时任一线程池饱和即为饱和
+        :return: bool
+        """
+        if pool == None:
+            return any(v >= cls.SATURATION_HIGH for v in list(cls.saturation.values()))
+        return cls.saturation.get(pool,0.0) >= cls.SATURATION_HIGH
+    
+    @classmethod
+    def stat_stuck_exit(cls,):
+        """
+        超时后脱离的线程最终退出
+        """
+        with cls.__lock:
+            cls.stuck_threads -= 1
+    
+    @classmethod
+    def stat_missed_ticks(cls,count:int=1):
+        """
+        延迟处理的心跳统计
+        
+        :param count: int 心跳数
+        """
+        with cls.__lock:
+            cls.missed_ticks += count
     
     def summary(self,) -> str:
         """
@@ -165,12 +315,12 @@ class StatManager:
         """
         if self.__master == True:
             return ""
-            
-        return """"
-    head   %s   |  %s  |  %s
-    tab    count | rety | success | success_rate  | tm_avg | tm_max | mem_avg | mem_max | cpu_avg | cpu_max | last_at
         
-           %s  --  %s  --  %s  --  %d  --  %d  --  %d  --  %f --  %d  --  %d  --  %d --  %d  --  %f  --  %f  --  %s    
+        return """
+    head   %s   |  %s  |  %s
+    tab    count | rety | success | success_rate  | tm_avg | tm_max | mem_avg | mem_max | cpu_avg | cpu_max | last_at | jitter_avg | jitter_max | missed | skipped | timeouts | shed
+           
+           %d  --  %d  --  %d  --  %f  --  %f  --  %f  --  %d  --  %d  --  %f  --  %f  --  %s  --  %f  --  %f  --  %d  --  %d  --  %d  --  %d    
         
         """ % (
             self.name,self.alias,self.run_type,
@@ -178,7 +328,8 @@ class StatManager:
             self.success_rate,self.tm_avg,
             self.tm_max,self.mem_avg,
             self.mem_max,self.cpu_avg,
-            self.cpu_max,str(self.last_at)
+            self.cpu_max,str(self.last_at),
+            self.jitter_avg,self.jitter_max,self.missed,self.skipped,self.timeouts,self.shed
             )
     
     def detail(self,after:int=0) -> str:
@@ -189,17 +340,17 @@ class StatManager:
         """
         if self.__master == True:
             return ""
-            
+        
         head = """
     head   %s  |  %s  |  %s
     tab    retry | st | ed | tmcost | mem | cpu | success | msg
         
         """ % (self.name,self.alias,self.run_type)
         det = """
-          %s  --  %s  --  %s  --  %d  --  %d  --  %f  --  %d  --  %s
+          %s  --  %s  --  %s  --  %f  --  %d  --  %f  --  %d  --  %s
         """
         desbs = []
-        for recd in self.run_list[after:len(self.run_list - 1)]:
+        for recd in self.run_list[after:]:
             desbs.append(det % (str(recd["retry"]),str(recd["st"]),str(recd["ed"]),recd["tmcost"],recd["mem"],recd["cpu"],recd["success"],recd["msg"]))
         
         return head + "\r\n".join(desbs)
@@ -211,11 +362,12 @@ class StatManager:
         
         :return: str
         """
-        tn = datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE))
+        tn = TaskClock.Now()
         
         return """
 head   %s  |  %s | %d 
-tab    run_times | success_times | last_run_task | last_run_at | success | msg
-       %d  --  %d  -- %s  --  %s  --  %d  --  %s
+tab    run_times | success_times | last_run_task | last_run_at | success | msg | missed_ticks | missed_times | skipped_times | timeout_times | stuck_threads | shed_times | saturation
+       %d  --  %d  -- %s  --  %s  --  %d  --  %s  --  %d  --  %d  --  %d  --  %d  --  %d  --  %d  --  %s
     
-    """ % (str(cls.start_at),str(tn),cls.task_count,cls.run_times,cls.success_times,cls.last_run_task,str(cls.last_run_at),cls.last_run_success,cls.last_run_msg)
\ No newline at end of file
+    """ % (str(cls.start_at),str(tn),cls.task_count,cls.run_times,cls.success_times,cls.last_run_task,str(cls.last_run_at),cls.last_run_success,cls.last_run_msg,cls.missed_ticks,cls.missed_times,cls.skipped_times,cls.timeout_times,cls.stuck_threads,cls.shed_times,
+           " ".join("%s:%.2f" % kv for kv in sorted(cls.saturation.items())))
\ No newline at end of file
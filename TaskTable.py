@@ -1,12 +1,18 @@
-import datetime,pytz
+import datetime
 from email.generator import Generator
 from TaskFactory import BaseTask
-from bdpyconsts import bdpyconsts
+from TaskCron import CompiledCron,CompileCron,IterFireStamps,StampToTime
+import TaskClock
 
 class TaskTable(object):
     # 单例实例
     __instance = None
     
+    # 任务变更事件 注册
+    EVENT_REGISTER = "REGISTER"
+    # 任务变更事件 移除
+    EVENT_REMOVE = "REMOVE"
+    
     def __new__(cls,*args,**kwargs):
         """
         单例化
@@ -16,6 +22,10 @@ class TaskTable(object):
         return cls.__instance
     
     def __init__(self,):
+        # 单例只初始化一次,避免清空已注册的任务
+        if hasattr(self,"_TaskTable__tasks"):
+            return
+        
         # 初始化任务列表
         self.__tasks = []
         # 调度任务
@@ -25,11 +35,17 @@ class TaskTable(object):
         # 单次运行任务
         self.__single_task = []
         # 启动时间
-        self.run_at = datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE))
+        self.run_at = TaskClock.Now()
         # 运行时间表
         self.run_time = {}
+        # 预编译的定时表达式 {任务名称:CompiledCron}
+        self.__crons = {}
+        # 任务变更监听
+        self.__watchers = []
+        # 秒倒排索引 [秒:{任务名称:任务}]
+        self.__second_index = [{} for _ in range(60)]
     
-    def register(self,task:BaseTask):
+    def __register(self,task:BaseTask):
         """
         注册任务
         
@@ -39,26 +55,144 @@ class TaskTable(object):
         
         # 定时任务
         if task.run_type() == task.TASK_RUN_SCHEDULE:
+            cron = CompileCron(task.shcd_con())
+            self.__crons[task.name()] = cron
             self.__schedule_tasks.append(task)
+            for second in range(60):
+                if (cron.second >> second) & 1:
+                    self.__second_index[second][task.name()] = task
         
         # 循环任务
-        if task.run_type() == task.TASK_RUN_MS_SECOND_LOOP:
+        elif task.run_type() in (task.TASK_RUN_SECOND_LOOP,task.TASK_RUN_MS_SECOND_LOOP):
             self.__loop_tasks.append(task)
-            return
         
         # 单次运行任务
-        if task.run_type() == task.TASK_RUN_SINGLE:
+        elif task.run_type() == task.TASK_RUN_SINGLE:
             self.__single_task.append(task)
+        
+        self.__notify(self.EVENT_REGISTER,task)
+    
+    def __unregister(self,task:BaseTask):
+        """
+        移除任务
+        
+        :param task: BaseTask 任务对象
+        """
+        name = task.name()
+        for tasks in (self.__tasks,self.__schedule_tasks,self.__loop_tasks,self.__single_task):
+            tasks[:] = [t for t in tasks if t.name() != name]
+        self.__crons.pop(name,None)
+        for bucket in self.__second_index:
+            bucket.pop(name,None)
+        
+        self.__notify(self.EVENT_REMOVE,task)
+    
+    def __notify(self,event:str,task:BaseTask):
+        """
+        通知任务变更
+        
+        :param event: str 变更事件
+        :param task: BaseTask 任务对象
+        """
+        for watcher in self.__watchers:
+            watcher(event,task)
+    
+    def watch(self,watcher):
+        """
+        监听任务注册和移除,运行中的调度器借此及时更新
+        
+        :param watcher: callable(event:str,task:BaseTask)
+        """
+        if watcher not in self.__watchers:
+            self.__watchers.append(watcher)
     
-    def range_schedule_task(self,tm:datetime.datetime) -> Generator:
+    def range_schedule_task(self,tm:datetime.datetime=None) -> Generator:
         """
         获取需要执行的定时任务列表
         
-        :param tm: datetime 时间对象
+        指定时间时只返回秒命中且时/分命中的候选任务,
+        年/月/日/周仍需调用方用 CompiledCron.matches 判断
+        
+        :param tm: datetime 时间对象,为空时返回全部定时任务
         :return: Generator
         """
-        for task in self.__schedule_tasks:
-            yield task
+        if tm == None:
+            for task in list(self.__schedule_tasks):
+                yield task
+            return
+        
+        for name,task in list(self.__second_index[tm.second].items()):
+            cron = self.__crons.get(name)
+            if cron == None:
+                continue
+            if (cron.minute >> tm.minute) & 1 and (cron.hour >> tm.hour) & 1:
+                yield task
+    
+    def cron(self,task:BaseTask) -> CompiledCron:
+        """
+        获取定时任务预编译的时间表达式
+        
+        :param task: BaseTask 任务对象
+        :return: CompiledCron
+        """
+        cron = self.__crons.get(task.name())
+        if cron == None:
+            cron = CompileCron(task.shcd_con())
+            self.__crons[task.name()] = cron
+        return cron
+    
+    def runs_today(self,day:datetime.datetime=None) -> dict:
+        """
+        各定时任务当天的执行次数
+        
+        :param day: datetime 当天任意时间,默认当前时间
+        :return: dict {任务名称:执行次数}
+        """
+        runs = {}
+        for task in list(self.__schedule_tasks):
+            runs[task.name()] = self.cron(task).runs_today(day=day)
+        return runs
+    
+    def iter_fire_stamps(self,start:datetime.datetime,end:datetime.datetime) -> Generator:
+        """
+        按时间顺序遍历 [start,end) 内所有定时任务的执行时间戳
+        
+        相同的定时表达式只展开一次,再按注册顺序产出各任务
+        
+        :param start: datetime 开始时间(含)
+        :param end: datetime 结束时间(不含)
+        :return: Generator[(int,BaseTask)]
+        """
+        crons = []
+        groups = {}
+        for task in list(self.__schedule_tasks):
+            cron = self.cron(task)
+            if id(cron) not in groups:
+                groups[id(cron)] = []
+                crons.append(cron)
+            groups[id(cron)].append(task)
+        
+        tasks = [groups[id(cron)] for cron in crons]
+        for ts,i in IterFireStamps(crons,start=start,end=end):
+            for task in tasks[i]:
+                yield (ts,task)
+    
+    def iter_fire_times(self,start:datetime.datetime,end:datetime.datetime) -> Generator:
+        """
+        按时间顺序遍历 [start,end) 内所有定时任务的执行
+        
+        :param start: datetime 开始时间(含)
+        :param end: datetime 结束时间(不含)
+        :return: Generator[(datetime,BaseTask)]
+        """
+        cache = {}
+        last = (None,None)
+        for ts,task in self.iter_fire_stamps(start=start,end=end):
+            # 同一秒的多个任务共用一个时间对象
+            if last[0] != ts:
+                tm = StampToTime(ts,cache)
+                last = (ts,tm if start.tzinfo != None else tm.replace(tzinfo=None))
+            yield (last[1],task)
     
     def range_sed_loop_task(self,) -> Generator:
         """
@@ -90,4 +224,18 @@ class TaskTable(object):
         else:
             ins = self.__instance
         
-        ins.register(task=task)
\ No newline at end of file
+        ins.__register(task=task)
+    
+    @classmethod
+    def unregister(self,task:BaseTask):
+        """
+        移除任务
+        
+        :param task: BaseTask 任务对象
+        """
+        if not self.__instance:
+            ins = TaskTable()
+        else:
+            ins = self.__instance
+        
+        ins.__unregister(task=task)
\ No newline at end of file
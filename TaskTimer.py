@@ -1,49 +1,180 @@
-import queue,datetime,pytz
+import asyncio,collections,functools,inspect,itertools,multiprocessing,os,queue,random,datetime,threading
 from time import sleep
-from retry import retry
-from hashlib import md5
 from TaskFactory import BaseTask
 from TaskTable import TaskTable
 from TaskStat import StatManager
-from TaskCron import IsTimeHit
-from concurrent.futures import ThreadPoolExecutor
+from TaskSched import HeapScheduler,WheelScheduler
+from TaskCron import SpreadOffset
+import TaskClock
+from concurrent.futures import ProcessPoolExecutor
+from TaskPool import TaskPool
+from TaskInstance import InstanceCache,Teardown
 from bdpyconsts import bdpyconsts
 
+
+class ExecContext:
+    """
+    一次执行(含全部重试)的上下文
+    """
+    __slots__ = ("id","task","tm","attempt","delay","done","cancel","start_ns","end_ns")
+    
+    def __init__(self,id:int,task:BaseTask,tm:datetime.datetime,done=None):
+        # 进程内单调递增的执行ID
+        self.id = id
+        # 任务类
+        self.task = task
+        # 计划执行时间
+        self.tm = tm
+        # 当前尝试次数,从 1 开始
+        self.attempt = 0
+        # 上一次重试间隔
+        self.delay = 0.0
+        # 执行结束(含全部重试)后的回调
+        self.done = done
+        # 当前线程尝试的取消标记,超时后置空
+        self.cancel = None
+        # 当前尝试的开始和结束时间(perf_counter 纳秒)
+        self.start_ns = 0
+        self.end_ns = 0
+
+
 class TaskTimer:
     # 定时器实例
     __timer = None
     
+    # 调度模式 每秒心跳轮询
+    SCHED_MODE_TICK = "TICK"
+    # 调度模式 最小堆截止时间
+    SCHED_MODE_HEAP = "HEAP"
+    # 调度模式 分层时间轮截止时间,适合大量任务
+    SCHED_MODE_WHEEL = "WHEEL"
+    # 调度模式 无心跳,按最小堆截止时间调度,日志打印也只在有执行时唤醒,没有到期任务时不唤醒
+    SCHED_MODE_TICKLESS = "TICKLESS"
+    
+    # 调度条目类型 定时任务
+    ENTRY_SCHEDULE = "SCHEDULE"
+    # 调度条目类型 单次任务
+    ENTRY_SINGLE = "SINGLE"
+    # 调度条目类型 秒循环任务
+    ENTRY_LOOP = "LOOP"
+    # 调度条目类型 毫秒循环任务
+    ENTRY_MS_LOOP = "MS_LOOP"
+    # 调度条目类型 失败重试
+    ENTRY_RETRY = "RETRY"
+    # 调度条目类型 线程任务超时检查
+    ENTRY_TIMEOUT = "TIMEOUT"
+    # 调度条目类型 心跳模式下按 spread 后移的定时任务执行
+    ENTRY_SPREAD = "SPREAD"
+    
+    # MISFIRE_FIRE_ALL 一次最多补执行的次数,更早错过的计入错过次数
+    MISFIRE_MAX_RUNS = 100
+    
+    # 默认线程池名称
+    POOL_DEFAULT = "default"
+    
     def __new__(cls,*args,**kwargs):
         if not cls.__timer:
             cls.__timer = object.__new__(cls)
         return cls.__timer
     
     
-    def __init__(self,console:bool) -> None:
+    def __init__(self,console:bool,mode:str=SCHED_MODE_TICK) -> None:
         # 是否打印执行记录
         self.console = console
+        # 调度模式
+        self.mode = mode
         
         # 任务表格
         self.__task_table = TaskTable()
         # 任务执行统计
         self.__task_stat = StatManager(task=None)
         # 初始化队列
-        self.__task_sched_queue = queue.Queue(maxsize=1)
+        # 心跳队列,保存每个心跳对应的秒级时间戳,不限长度避免丢失心跳
+        self.__task_sched_queue = queue.Queue()
         self.__task_single_queue = queue.Queue(maxsize=1)
-        # 任务ID记录
-        self.__task_ids = {}
         
-        # 启动线程池管理
+        # 启动线程池管理,线程数在 [MIN_TASK_THREAD,MAX_TASK_THREAD] 之间按排队等待伸缩
         mxw = bdpyconsts.MAX_TASK_THREAD
         if not mxw:
             mxw = 20
         else:
             mxw = int(mxw)
-            if mxw < 5:
-                mxw += 5
         
-        self.__pool = ThreadPoolExecutor(max_workers=mxw)
+        mnw = getattr(bdpyconsts,"MIN_TASK_THREAD",None)
+        if not mnw:
+            mnw = 4
+        else:
+            mnw = int(mnw)
+        
+        alive = getattr(bdpyconsts,"TASK_THREAD_KEEP_ALIVE",None)
+        if not alive:
+            alive = 60.0
+        else:
+            alive = float(alive)
         
+        # 排队上限,队列已满时按 TASK_QUEUE_SHED 处理新的执行,未配置时不限制
+        qsize = getattr(bdpyconsts,"TASK_QUEUE_SIZE",None)
+        if not qsize:
+            qsize = 0
+        else:
+            qsize = int(qsize)
+        
+        shed = getattr(bdpyconsts,"TASK_QUEUE_SHED",None)
+        if not shed:
+            shed = TaskPool.SHED_REJECT_NEWEST
+        
+        block = getattr(bdpyconsts,"TASK_QUEUE_BLOCK",None)
+        if not block:
+            block = 1.0
+        else:
+            block = float(block)
+        
+        # 日志打印和心跳监听常驻占用线程,上限至少为 5
+        self.__pool = TaskPool(min_workers=mnw,max_workers=max(mxw,mnw,5),keep_alive=alive,name="TaskTimer",max_queue=qsize,shed=shed,block_timeout=block)
+        # 按 pool_name 隔离的线程池 {名称:TaskPool},未通过 add_pool 配置的按 [1,MAX_TASK_THREAD] 创建
+        self.__pools = {self.POOL_DEFAULT:self.__pool}
+        self.__pools_lock = threading.Lock()
+        
+        # 截止时间调度
+        if mode == self.SCHED_MODE_WHEEL:
+            self.__sched = WheelScheduler(start=TaskClock.MonoTs())
+        else:
+            self.__sched = HeapScheduler()
+        self.__sched_cond = threading.Condition()
+        self.__sched_running = False
+        # 已加入调度的循环任务名称
+        self.__loop_names = set()
+        # 毫秒循环状态 {任务名称:[起点时间戳,间隔秒数,执行点序号]}
+        self.__ms_loops = {}
+        # 心跳模式下已加入调度的 spread 条目 {任务名称:set(条目键)}
+        self.__spread_keys = {}
+        self.__task_table.watch(self.__on_table_change)
+        # 有执行提交或结束,无心跳模式下唤醒日志打印
+        self.__activity = threading.Event()
+        
+        # 协程任务的事件循环,首次执行协程任务时启动
+        self.__async_loop = None
+        self.__async_lock = threading.Lock()
+        # 进程任务的进程池,首次需要时启动并预热
+        self.__process_pool = None
+        
+        # 正在执行的数量 {任务名称:数量}
+        self.__inflight = {}
+        # 并发达到上限时等待的一次执行 {任务名称:(执行时间,回调)}
+        self.__pending = {}
+        # 可取消的协程和进程执行 {任务名称:set(Future)}
+        self.__running = {}
+        self.__inflight_lock = threading.Lock()
+        
+        # 执行ID
+        self.__exec_ids = itertools.count(1)
+        # 进行中的执行 {执行ID:ExecContext},含等待重试的执行
+        self.__executions = {}
+        self.__exec_lock = threading.Lock()
+        
+        # 按 lifecycle 复用的任务实例
+        self.__instances = InstanceCache()
+    
     
     def run(self,):
         """
@@ -53,21 +184,59 @@ class TaskTimer:
         """
         # 启动日志打印
         self.__pool.submit(self.console_log)
+        
+        # 已注册进程任务时提前启动进程池
+        tasks = list(self.__task_table.range_schedule_task(tm=None))
+        tasks.extend(self.__task_table.range_single_task())
+        tasks.extend(self.__task_table.range_sed_loop_task())
+        if any(self.__executor(task) == BaseTask.EXECUTOR_PROCESS for task in tasks):
+            self.__get_process_pool()
+        
+        # 截止时间调度,阻塞在最近的截止时间上
+        if self.__deadline_mode():
+            self.run_deadline_tasks()
+            return
+        
+        # 心跳模式下循环任务仍由截止时间调度
+        threading.Thread(target=self.run_deadline_tasks,name="TaskTimerDeadline",daemon=True).start()
+        
         # 启动定时任务监听
         self.__pool.submit(self.run_sched_tasks)
-        # 启动循环任务
-        self.run_sed_loop_tasks()
         
-        # 启动时间心跳
+        # 启动时间心跳,每个心跳携带它对应的整秒时间戳,延迟唤醒时补齐中间的秒
+        # 按单调时钟睡眠到下一个整秒,系统时间回拨时不会长时间睡眠
+        tick = int(TaskClock.NowTs())
         while True:
+            now = TaskClock.NowTs()
+            sleep(max(int(now) + 1 - now,0))
+            tick = self.__heartbeat(tick)
             try:
-                sleep(1)
-                self.__task_sched_queue.put_nowait(1)
                 self.__task_single_queue.put_nowait(1)
             except queue.Full:
                 pass
     
     
+    def __heartbeat(self,tick:int) -> int:
+        """
+        补齐上一个心跳之后到当前秒(含)的心跳
+        
+        系统时间回拨超过 1 秒时从回拨后的时间继续心跳,回拨区间内的秒按新的时间重新触发
+        
+        :param tick: int 上一个心跳的秒级时间戳
+        :return: int 最新心跳的秒级时间戳
+        """
+        now = int(TaskClock.NowTs())
+        if now < tick - 1:
+            if self.console:
+                print("clock  stepped back %ds, heartbeat restarts at %s" % (tick - now,str(TaskClock.FromTs(now))))
+            tick = now - 1
+        
+        while tick < now:
+            tick += 1
+            self.__task_sched_queue.put(tick)
+        return tick
+    
+    
     def console_log(self,):
         """
         打印执行日志
@@ -78,18 +247,37 @@ class TaskTimer:
             return
         
         last_count = self.__task_stat.run_times
+        last_scaled = {}
         sumsed = 0
         while True:
-            # 睡眠等待
+            # 无心跳模式下等到有执行再打印
+            if self.mode == self.SCHED_MODE_TICKLESS:
+                self.__activity.wait()
+                self.__activity.clear()
+            
+            # 睡眠等待,合并一秒内的执行
             sleep(1)
             
             # 统计当前任务执行次数
             current_count = self.__task_stat.run_times
             
             # 总体打印
+            pools = list(self.__pools.values())
             if sumsed % 5 == 0:
                 print(self.__task_stat.summary())
+                for pool in pools:
+                    print(pool.describe())
                 sumsed = 0
+            
+            # 线程池伸缩打印
+            for pool in pools:
+                stats = pool.stats()
+                scaled = stats["grow"] + stats["shrink"]
+                last = last_scaled.get(pool.name,0)
+                if scaled > last:
+                    for event in pool.events()[last - scaled:]:
+                        print("pool   %s  %s  %s  size=%d  %s" % (pool.name,str(event["at"]),event["event"],event["size"],event["reason"]))
+                    last_scaled[pool.name] = scaled
             sumsed += 1
             
             # 单次执行打印
@@ -98,6 +286,62 @@ class TaskTimer:
                 last_count = current_count
     
     
+    def pool_stats(self,) -> dict:
+        """
+        各线程池状态,包括当前线程数、排队数、排队等待和最近的伸缩事件
+        
+        :return: dict {线程池名称:状态}
+        """
+        res = {}
+        for name,pool in list(self.__pools.items()):
+            res[name] = pool.stats()
+            res[name]["events"] = pool.events()
+        return res
+    
+    
+    def add_pool(self,name:str,min_workers:int,max_workers:int,keep_alive:float=60.0,max_queue:int=None,shed:str=None,block_timeout:float=None) -> TaskPool:
+        """
+        配置一个隔离的线程池,pool_name 返回该名称的任务只在这个池中执行
+        
+        :param name: str 线程池名称
+        :param min_workers: int 最少线程数
+        :param max_workers: int 最多线程数
+        :param keep_alive: float 空闲线程保留秒数
+        :param max_queue: int 排队上限,0 不限制,为空时与默认线程池相同
+        :param shed: str 队列已满时的处理方式,为空时与默认线程池相同
+        :param block_timeout: float TaskPool.SHED_BLOCK 最多阻塞的秒数,为空时与默认线程池相同
+        :return: TaskPool
+        """
+        if max_queue == None:
+            max_queue = self.__pool.max_queue
+        with self.__pools_lock:
+            if name in self.__pools:
+                raise ValueError("pool %s already exists" % name)
+            pool = TaskPool(min_workers=min_workers,max_workers=max_workers,keep_alive=keep_alive,name=name,max_queue=max_queue,
+                            shed=shed or self.__pool.shed,block_timeout=block_timeout or self.__pool.block_timeout)
+            self.__pools[name] = pool
+            return pool
+    
+    
+    def __task_pool(self,task:BaseTask) -> TaskPool:
+        """
+        获取任务所在的线程池
+        
+        :param task: BaseTask 任务类
+        :return: TaskPool
+        """
+        name = task.pool_name() or self.POOL_DEFAULT
+        pool = self.__pools.get(name)
+        if pool != None:
+            return pool
+        
+        with self.__pools_lock:
+            if name not in self.__pools:
+                self.__pools[name] = TaskPool(min_workers=1,max_workers=self.__pool.max_workers,keep_alive=self.__pool.keep_alive,name=name,
+                                              max_queue=self.__pool.max_queue,shed=self.__pool.shed,block_timeout=self.__pool.block_timeout)
+            return self.__pools[name]
+    
+    
     def run_sched_tasks(self,):
         """
         运行定时任务
@@ -105,10 +349,370 @@ class TaskTimer:
         :return:
         """
         while True:
-            self.__task_sched_queue.get()
-            tm = datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE))
-            for task in self.__task_table.range_schedule_task():
-                self.__pool.submit(self.run_task_with_retry,task=task,tm=tm)
+            # 一次取出所有积压的心跳
+            ticks = [self.__task_sched_queue.get()]
+            while True:
+                try:
+                    ticks.append(self.__task_sched_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.__on_ticks(ticks)
+    
+    
+    def __on_ticks(self,ticks:list):
+        """
+        处理一批心跳,提交命中的定时任务
+        
+        :param ticks: list[int] 心跳对应的秒级时间戳
+        """
+        now = TaskClock.NowTs()
+        late = len([ts for ts in ticks if now - ts > 1])
+        if late:
+            self.__task_stat.stat_missed_ticks(count=late)
+        
+        # 超过宽限的执行时间按任务的错过处理方式补执行
+        misfires = {}
+        for ts in ticks:
+            tm = TaskClock.FromTs(ts)
+            for task in self.__task_table.range_schedule_task(tm=tm):
+                if now - ts > task.misfire_grace():
+                    if self.__task_table.cron(task).matches(tm=tm):
+                        misfires.setdefault(task.name(),(task,[]))[1].append(tm)
+                # spread 的条目到期后直接执行,入队前先判断年/月/日/周
+                elif task.spread():
+                    if self.__task_table.cron(task).matches(tm=tm):
+                        self.__push_spread(task=task,tm=tm)
+                else:
+                    self.__submit(self.run_task_with_retry,task=task,tm=tm)
+        
+        for task,tms in misfires.values():
+            for tm in self.__misfire_runs(task=task,tms=tms):
+                self.__submit(self.run_task_with_retry,task=task,tm=tm)
+    
+    
+    def __push_spread(self,task:BaseTask,tm:datetime.datetime):
+        """
+        心跳模式下把设置了 spread 的定时任务按偏移后的时间加入截止时间调度
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 表达式的执行时间
+        """
+        ts = tm.timestamp()
+        key = (self.ENTRY_SPREAD,task.name(),ts)
+        with self.__sched_cond:
+            self.__sched.push(key,TaskClock.TsToMono(ts + self.__spread(task)),(self.ENTRY_SPREAD,task,tm))
+            self.__spread_keys.setdefault(task.name(),set()).add(key)
+            self.__sched_cond.notify()
+    
+    
+    def __spread(self,task:BaseTask) -> float:
+        """
+        定时任务的错开偏移
+        
+        :param task: BaseTask 任务类
+        :return: float 秒
+        """
+        window = task.spread()
+        if not window:
+            return 0.0
+        return SpreadOffset(task.name(),window)
+    
+    
+    def __misfire_runs(self,task:BaseTask,tms,cutoff:float=None) -> list:
+        """
+        按任务的错过处理方式选出需要补执行的时间,其余计入错过次数
+        
+        逐个遍历,不保留全部错过的时间:MISFIRE_FIRE_ONCE 只保留最后一次,
+        MISFIRE_FIRE_ALL 只保留最近的 MISFIRE_MAX_RUNS 次
+        
+        :param task: BaseTask 任务类
+        :param tms: Iterable[datetime] 执行时间,按时间排序
+        :param cutoff: float 不早于该时间戳的执行时间仍在宽限内,直接执行,为空时全部已超过宽限
+        :return: list[datetime]
+        """
+        misfire = task.misfire()
+        if misfire == BaseTask.MISFIRE_FIRE_ALL:
+            keep = self.MISFIRE_MAX_RUNS
+        elif misfire == BaseTask.MISFIRE_SKIP:
+            keep = 0
+        else:
+            keep = 1
+        
+        late = collections.deque(maxlen=keep)
+        runs = []
+        count = 0
+        for tm in tms:
+            if cutoff != None and tm.timestamp() >= cutoff:
+                runs.append(tm)
+            else:
+                count += 1
+                late.append(tm)
+        
+        missed = count - len(late)
+        if missed:
+            StatManager(task=task).stat_missed(count=missed)
+        return list(late) + runs
+    
+    
+    def __deadline_mode(self,) -> bool:
+        """
+        定时任务和单次任务是否按截止时间调度
+        
+        :return: bool
+        """
+        return self.mode in (self.SCHED_MODE_HEAP,self.SCHED_MODE_WHEEL,self.SCHED_MODE_TICKLESS)
+    
+    
+    def run_deadline_tasks(self,):
+        """
+        按截止时间运行任务
+        
+        循环任务始终由这里调度,定时任务和单次任务只在截止时间模式下由这里调度。
+        没有到期任务时阻塞在条件变量上,直到最近的截止时间或任务变更
+        
+        :return:
+        """
+        with self.__sched_cond:
+            self.__sched_running = True
+            for task in self.__task_table.range_schedule_task(tm=None):
+                self.__arm_task(task)
+            for task in self.__task_table.range_single_task():
+                self.__arm_task(task)
+            self.run_sed_loop_tasks()
+        
+        while True:
+            with self.__sched_cond:
+                due = self.__sched.pop_due(TaskClock.MonoTs())
+                while not due:
+                    deadline = self.__sched.next_deadline()
+                    if deadline == None:
+                        self.__sched_cond.wait()
+                    else:
+                        self.__sched_cond.wait(max(deadline - TaskClock.MonoTs(),0))
+                    due = self.__sched.pop_due(TaskClock.MonoTs())
+                
+                jobs = []
+                for deadline,key,(kind,task,tm) in due:
+                    jobs.extend(self.__on_due(kind=kind,task=task,tm=tm,deadline=deadline,key=key))
+            
+            for func,kwargs in jobs:
+                # 超时后的失败处理只更新状态,在调度线程上执行
+                if func == self.__attempt_failed:
+                    func(**kwargs)
+                else:
+                    self.__submit(func,**kwargs)
+    
+    
+    def __on_due(self,kind:str,task:BaseTask,tm:datetime.datetime,deadline:float,key=None) -> list:
+        """
+        处理一个到期条目,重新加入调度并返回需要提交的执行,需持有调度锁
+        
+        :param kind: str 条目类型
+        :param task: BaseTask 任务类
+        :param tm: datetime 本次执行时间
+        :param deadline: float 截止时间(单调时钟)
+        :param key: 条目键
+        :return: list [(执行函数,参数)]
+        """
+        # 定时任务和固定频率的循环任务按本次执行时间计算下一次截止时间
+        if kind == self.ENTRY_SCHEDULE:
+            return self.__on_schedule_due(task=task,tm=tm,deadline=deadline)
+        elif kind == self.ENTRY_LOOP:
+            if task.loop_mode() == BaseTask.LOOP_FIXED_RATE:
+                self.__arm_task(task,prev=deadline)
+            return [(self.__run_loop_task,{"task":task,"tm":tm})]
+        elif kind == self.ENTRY_MS_LOOP:
+            return self.__on_ms_loop_due(task=task,deadline=deadline)
+        elif kind == self.ENTRY_SPREAD:
+            keys = self.__spread_keys.get(task.name())
+            if keys != None:
+                keys.discard(key)
+                if not keys:
+                    del self.__spread_keys[task.name()]
+            return [(self.__run_task,{"task":task,"tm":tm})]
+        elif kind == self.ENTRY_RETRY:
+            return [(self.__run_attempt,{"task":task,"tm":tm,"exec_id":key[1]})]
+        elif kind == self.ENTRY_TIMEOUT:
+            if not self.__on_attempt_timeout(task=task,exec_id=key[1]):
+                return []
+            # 重试和释放名额可能提交执行,在释放调度锁后处理
+            jobs = [(self.__attempt_failed,{"task":task,"tm":tm,"exec_id":key[1]})]
+            if task.logabnormal():
+                jobs.append((self.__report_timeout,{"task":task}))
+            return jobs
+        
+        return [(self.__run_task,{"task":task,"tm":tm})]
+    
+    
+    def __on_schedule_due(self,task:BaseTask,tm:datetime.datetime,deadline:float) -> list:
+        """
+        定时任务到期,超过宽限时连同之后错过的执行时间按错过处理方式补执行,需持有调度锁
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 本次执行时间
+        :param deadline: float 截止时间(单调时钟)
+        :return: list [(执行函数,参数)]
+        """
+        # 是否错过按墙上时间判断,截止时间是按加入调度时的校准换算的
+        now = TaskClock.NowTs()
+        offset = self.__spread(task)
+        target = tm.timestamp() + offset
+        
+        # 系统时间回拨后还没到执行时间,按新的校准重新加入调度
+        if target - now > 1:
+            self.__sched.push(task.name(),TaskClock.MonoTs() + target - now,(self.ENTRY_SCHEDULE,task,tm))
+            return []
+        
+        grace = task.misfire_grace()
+        if now - target <= grace:
+            self.__arm_task(task,after=tm)
+            return [(self.__run_task,{"task":task,"tm":tm})]
+        
+        # 截止时间到当前秒(含)之间的全部执行时间,按 spread 偏移前的时间计算,惰性遍历
+        end = TaskClock.FromTs(int(now - offset) + 1)
+        tms = itertools.chain([tm],self.__task_table.cron(task).iter_fire_times(start=tm + datetime.timedelta(seconds=1),end=end))
+        runs = self.__misfire_runs(task=task,tms=tms,cutoff=now - offset - grace)
+        
+        self.__arm_task(task,after=TaskClock.FromTs(int(now - offset)))
+        return [(self.__run_task,{"task":task,"tm":t}) for t in runs]
+    
+    
+    def __on_ms_loop_due(self,task:BaseTask,deadline:float) -> list:
+        """
+        毫秒循环到期,按补偿方式处理错过的执行点并对齐到下一个执行点,需持有调度锁
+        
+        :param task: BaseTask 任务类
+        :param deadline: float 到期的执行点(单调时钟)
+        :return: list [(执行函数,参数)]
+        """
+        state = self.__ms_loops.get(task.name())
+        if state == None:
+            return []
+        anchor,period,index = state
+        
+        # 到期之后又错过的执行点数
+        behind = max(int((TaskClock.MonoTs() - deadline) // period),0)
+        points = [anchor + (index + i) * period for i in range(behind + 1)]
+        
+        catchup = task.loop_catchup()
+        if behind == 0 or catchup == BaseTask.CATCHUP_ALL:
+            runs = points
+        elif catchup == BaseTask.CATCHUP_ONCE:
+            runs = points[-1:]
+        else:
+            runs = []
+        
+        missed = len(points) - len(runs)
+        if missed:
+            StatManager(task=task).stat_missed(count=missed)
+        
+        state[2] = index + behind
+        self.__arm_task(task)
+        return [(self.__run_ms_loop_task,{"task":task,"tm":TaskClock.FromTs(TaskClock.MonoToTs(point)),"deadline":point}) for point in runs]
+    
+    
+    def __arm_task(self,task:BaseTask,after:datetime.datetime=None,prev:float=None):
+        """
+        计算任务下一次截止时间并加入调度,需持有调度锁
+        
+        截止时间使用单调时钟,循环任务的间隔不受系统时间跳变影响,
+        定时任务和单次任务的墙上时间按当前校准换算
+        
+        :param task: BaseTask 任务类
+        :param after: datetime 从该时间之后开始计算
+        :param prev: float 固定频率循环任务上一次的截止时间(单调时钟)
+        """
+        # 首次加入调度,偏移后仍未到期的执行时间也要加入
+        first = not after
+        if first:
+            after = TaskClock.Now()
+        
+        # 毫秒循环定时,执行点 = 起点 + 序号 * 间隔,不随执行耗时漂移
+        if task.run_type() == BaseTask.TASK_RUN_MS_SECOND_LOOP:
+            if task.name() not in self.__loop_names:
+                return
+            state = self.__ms_loops.get(task.name())
+            if state == None:
+                ms = task.loop_ms()
+                if not ms:
+                    ms = task.loop_sed() * 1000
+                state = [TaskClock.MonoTs(),ms / 1000,0]
+                self.__ms_loops[task.name()] = state
+            state[2] += 1
+            deadline = state[0] + state[2] * state[1]
+            self.__sched.push(task.name(),deadline,(self.ENTRY_MS_LOOP,task,None))
+            return
+        
+        # 秒循环定时
+        if task.run_type() == BaseTask.TASK_RUN_SECOND_LOOP:
+            if task.name() not in self.__loop_names:
+                return
+            if prev == None:
+                prev = TaskClock.MonoTs()
+            deadline = prev + task.loop_sed()
+            self.__sched.push(task.name(),deadline,(self.ENTRY_LOOP,task,TaskClock.FromTs(TaskClock.MonoToTs(deadline))))
+            return
+        
+        # 心跳模式下定时任务和单次任务由心跳轮询
+        if not self.__deadline_mode():
+            return
+        
+        # 时间表达式定时,执行时间按 spread 后移
+        if task.run_type() == BaseTask.TASK_RUN_SCHEDULE:
+            offset = self.__spread(task)
+            if first:
+                after = TaskClock.FromTs(after.timestamp() - offset)
+            tm = self.__task_table.cron(task).next_fire_today(after=after)
+            if tm:
+                self.__sched.push(task.name(),TaskClock.TsToMono(tm.timestamp() + offset),(self.ENTRY_SCHEDULE,task,tm))
+            return
+        
+        # 单次运行定时
+        if task.run_type() == BaseTask.TASK_RUN_SINGLE:
+            if task.name() in self.__task_stat.task_stats:
+                return
+            run_at = task.single_tm()
+            if run_at.startswith(BaseTask.SINGLE_TASK_RUN_TIME):
+                tm = datetime.datetime.strptime(run_at.replace(BaseTask.SINGLE_TASK_RUN_TIME, ""),"%Y-%m-%d %H:%M:%S")
+                tm = TaskClock.Localize(tm)
+            elif run_at.startswith(BaseTask.SINGLE_TASK_RUN_AFTER):
+                run_af = int(run_at.replace(BaseTask.SINGLE_TASK_RUN_AFTER, ""))
+                tm = self.__task_stat.start_at + datetime.timedelta(seconds=run_af)
+            else:
+                return
+            self.__sched.push(task.name(),TaskClock.TsToMono(tm.timestamp()),(self.ENTRY_SINGLE,task,tm))
+    
+    
+    def __on_table_change(self,event:str,task:BaseTask):
+        """
+        运行中注册或移除任务时更新调度并唤醒调度线程
+        
+        :param event: str 变更事件
+        :param task: BaseTask 任务类
+        """
+        # 移除的任务不再执行等待的一次,进行中的执行不再重试
+        if event != TaskTable.EVENT_REGISTER:
+            with self.__inflight_lock:
+                pending = self.__pending.pop(task.name(),None)
+            if pending != None and pending[1] != None:
+                pending[1]()
+            self.__cancel_executions(task)
+            self.teardown_instances(name=task.name())
+        
+        with self.__sched_cond:
+            if not self.__sched_running:
+                return
+            if event == TaskTable.EVENT_REGISTER:
+                if task.run_type() in (BaseTask.TASK_RUN_SECOND_LOOP,BaseTask.TASK_RUN_MS_SECOND_LOOP):
+                    self.__loop_names.add(task.name())
+                self.__arm_task(task)
+            else:
+                self.__loop_names.discard(task.name())
+                self.__ms_loops.pop(task.name(),None)
+                self.__sched.cancel(task.name())
+                for key in self.__spread_keys.pop(task.name(),()):
+                    self.__sched.cancel(key)
+            self.__sched_cond.notify()
     
     
     def run_task_with_retry(self,task:BaseTask,tm=datetime.datetime):
@@ -120,7 +724,7 @@ class TaskTimer:
         """
         # 时间表达式定时
         if task.run_type() == BaseTask.TASK_RUN_SCHEDULE:
-            if not IsTimeHit(con=task.shcd_con(),tm=tm):
+            if not self.__task_table.cron(task).matches(tm=tm):
                 return None
         
         # 单次运行定时
@@ -138,7 +742,7 @@ class TaskTimer:
             # 判断是否到了执行秒数
             elif run_at.startswith(BaseTask.SINGLE_TASK_RUN_AFTER):
                 run_af = int(run_at.replace(BaseTask.SINGLE_TASK_RUN_AFTER, ""))
-                tn = int(datetime.datetime.now().timestamp())
+                tn = int(TaskClock.NowTs())
                 ts = int(self.__task_stat.start_at.timestamp())
                 if (tn - ts) < run_af:
                     return None
@@ -146,87 +750,724 @@ class TaskTimer:
         else:
             return None
         
-        if not task.timeout():
-            tmout = None
+        self.__run_task(task=task,tm=tm)
+    
+    
+    def __submit(self,func,**kwargs):
+        """
+        提交一次执行,协程和进程任务直接在调用线程上交给事件循环,不占用工作线程
+        
+        线程池队列已满时按线程池的 shed 拒绝或丢弃执行,由 __shed 收尾
+        
+        :param func: callable 执行函数
+        :param kwargs: dict 执行参数,必须包含 task
+        """
+        task = kwargs["task"]
+        self.__activity.set()
+        if self.__executor(task) != BaseTask.EXECUTOR_THREAD:
+            func(**kwargs)
+            return
+        
+        pool = self.__task_pool(task)
+        pool.dispatch(task.name(),task.priority() or 0,func,kwargs,on_shed=functools.partial(self.__shed,func,kwargs))
+        StatManager.stat_saturation(pool=pool.name,ratio=pool.saturation())
+    
+    
+    def __shed(self,func,kwargs:dict,reason:str):
+        """
+        一次执行因线程池队列已满被拒绝或丢弃,释放它占用的状态并通知任务
+        
+        :param func: callable 执行函数
+        :param kwargs: dict 执行参数
+        :param reason: str TaskPool.SHED_REJECT_NEWEST|TaskPool.SHED_DROP_OLDEST_SAME_TASK|TaskPool.SHED_BLOCK
+        """
+        task = kwargs["task"]
+        StatManager(task=task).stat_shed()
+        
+        # 固定间隔的循环任务需要重新加入调度,否则不会再执行
+        if func == self.__run_loop_task and task.loop_mode() != BaseTask.LOOP_FIXED_RATE:
+            self.__rearm_loop_task(task)
+        # 重试已占用执行名额
+        elif func == self.__run_attempt:
+            ctx = self.__exec_pop(kwargs["exec_id"])
+            if ctx != None:
+                self.__release(task=task,done=ctx.done)
+        elif func == self.__run_task and kwargs.get("done") != None:
+            kwargs["done"]()
+        
+        try:
+            task.on_shed(reason)
+        except Exception:
+            pass
+    
+    
+    def __executor(self,task:BaseTask) -> str:
+        """
+        任务的执行方式
+        
+        :param task: BaseTask 任务类
+        :return: str EXECUTOR_THREAD|EXECUTOR_PROCESS|EXECUTOR_ASYNC
+        """
+        executor = task.executor()
+        if executor:
+            return executor
+        if asyncio.iscoroutinefunction(task.run) or asyncio.iscoroutinefunction(task.after):
+            return BaseTask.EXECUTOR_ASYNC
+        return BaseTask.EXECUTOR_THREAD
+    
+    
+    def __get_async_loop(self,) -> asyncio.AbstractEventLoop:
+        """
+        获取协程任务的事件循环,不存在时在独立线程上启动
+        
+        :return: AbstractEventLoop
+        """
+        with self.__async_lock:
+            if self.__async_loop == None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever,name="TaskTimerAsync",daemon=True).start()
+                self.__async_loop = loop
+            return self.__async_loop
+    
+    
+    def __get_process_pool(self,) -> ProcessPoolExecutor:
+        """
+        获取进程池,不存在时使用 forkserver 启动并预热全部工作进程
+        
+        :return: ProcessPoolExecutor
+        """
+        with self.__async_lock:
+            if self.__process_pool == None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    ctx = multiprocessing.get_context("forkserver")
+                    ctx.set_forkserver_preload(["TaskFactory","TaskClock"])
+                else:
+                    ctx = multiprocessing.get_context()
+                workers = os.cpu_count() or 1
+                self.__process_pool = ProcessPoolExecutor(max_workers=workers,mp_context=ctx)
+                for _ in range(workers):
+                    self.__process_pool.submit(os.getpid)
+            return self.__process_pool
+    
+    
+    def __replace_process_pool(self,pool:ProcessPoolExecutor):
+        """
+        终止超时任务所在的进程池并换成新的进程池,池中其他进行中的任务按失败处理
+        
+        :param pool: ProcessPoolExecutor 超时任务所在的进程池
+        """
+        with self.__async_lock:
+            if self.__process_pool is not pool:
+                return
+            self.__process_pool = None
+        
+        for proc in list(getattr(pool,"_processes",{}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False,cancel_futures=True)
+        self.__get_process_pool()
+    
+    
+    def __run_task(self,task:BaseTask,tm:datetime.datetime,done=None):
+        """
+        执行一个已到期的任务,失败时按 backoff 重试
+        
+        线程任务的重试作为截止时间条目加入调度,等待期间不占用工作线程;
+        协程和进程任务交给事件循环后立即返回
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :param done: callable 执行结束(含全部重试)后的回调
+        """
+        if not self.__acquire(task=task,tm=tm,done=done):
+            return
+        
+        if self.__executor(task) != BaseTask.EXECUTOR_THREAD:
+            future = asyncio.run_coroutine_threadsafe(self.__run_async_task(task=task,tm=tm),self.__get_async_loop())
+            with self.__inflight_lock:
+                self.__running.setdefault(task.name(),set()).add(future)
+            future.add_done_callback(lambda f: self.__release(task=task,done=done,future=f))
+            return
+        
+        ctx = self.__exec_new(task=task,tm=tm,done=done)
+        self.__run_attempt(task=task,tm=tm,exec_id=ctx.id)
+    
+    
+    def executions(self,) -> list:
+        """
+        进行中的执行,含等待重试的执行
+        
+        :return: list [{"id":执行ID,"name":任务名称,"tm":计划执行时间,"attempt":当前尝试次数,"running":当前尝试已运行秒数}]
+        """
+        now = TaskClock.PerfNs()
+        with self.__exec_lock:
+            ctxs = list(self.__executions.values())
+        res = []
+        for ctx in ctxs:
+            running = 0.0
+            if ctx.start_ns and not ctx.end_ns:
+                running = (now - ctx.start_ns) / 1e9
+            res.append({"id":ctx.id,"name":ctx.task.name(),"tm":ctx.tm,"attempt":ctx.attempt,"running":running})
+        return res
+    
+    
+    def teardown_instances(self,name:str=None):
+        """
+        对复用的任务实例执行 teardown,之后的执行重新创建实例
+        
+        :param name: str 任务名称,为空时处理全部任务
+        """
+        for ins in self.__instances.drain(name=name):
+            if asyncio.iscoroutinefunction(ins.teardown) and self.__async_loop != None:
+                asyncio.run_coroutine_threadsafe(self.__await_teardown(pool=self.__task_pool(type(ins)),ins=ins),self.__async_loop)
+            else:
+                Teardown([ins])
+    
+    
+    def __exec_new(self,task:BaseTask,tm:datetime.datetime,done=None) -> ExecContext:
+        """
+        登记一次执行
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :param done: callable 执行结束(含全部重试)后的回调
+        :return: ExecContext
+        """
+        ctx = ExecContext(next(self.__exec_ids),task,tm,done)
+        with self.__exec_lock:
+            self.__executions[ctx.id] = ctx
+        return ctx
+    
+    
+    def __exec_pop(self,exec_id:int) -> ExecContext:
+        """
+        移除一次已结束的执行
+        
+        :param exec_id: int 执行ID
+        :return: ExecContext|None 已移除时为 None
+        """
+        with self.__exec_lock:
+            return self.__executions.pop(exec_id,None)
+    
+    
+    def __run_attempt(self,task:BaseTask,tm:datetime.datetime,exec_id:int):
+        """
+        线程任务的一次尝试,失败且还有重试次数时按 backoff 加入调度后立即返回
+        
+        设置了 timeout 时同时加入超时检查条目,超时后本次尝试被脱离,不再等待它结束
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :param exec_id: int 执行ID
+        """
+        with self.__exec_lock:
+            ctx = self.__executions.get(exec_id)
+        if ctx == None:
+            return
+        ctx.attempt += 1
+        cancel = threading.Event()
+        with self.__sched_cond:
+            ctx.cancel = cancel
+            if task.timeout():
+                self.__sched.push((self.ENTRY_TIMEOUT,exec_id),TaskClock.MonoTs() + task.timeout(),(self.ENTRY_TIMEOUT,task,tm))
+                self.__sched_cond.notify()
+        
+        ok = True
+        try:
+            self.__task_call_back(task=task,ctx=ctx,cancel=cancel)
+        except Exception:
+            ok = False
+        
+        with self.__sched_cond:
+            # 已超时,重试和释放已由超时检查处理
+            if ctx.cancel is not cancel:
+                self.__task_stat.stat_stuck_exit()
+                return
+            ctx.cancel = None
+            self.__sched.cancel((self.ENTRY_TIMEOUT,exec_id))
+        
+        # 被 OVERLAP_CANCEL_PREVIOUS 取消的执行不再重试
+        if ok or cancel.is_set():
+            self.__exec_pop(exec_id)
+            self.__release(task=task,done=ctx.done)
+        else:
+            self.__attempt_failed(task=task,tm=tm,exec_id=exec_id)
+    
+    
+    def __attempt_failed(self,task:BaseTask,tm:datetime.datetime,exec_id:int):
+        """
+        线程任务的一次尝试失败,还有重试次数时按 backoff 加入调度,否则结束本次执行
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :param exec_id: int 执行ID
+        """
+        with self.__exec_lock:
+            ctx = self.__executions.get(exec_id)
+        if ctx == None:
+            return
+        if ctx.attempt < task.trytimes():
+            ctx.delay = self.__retry_delay(task=task,attempt=ctx.attempt,prev=ctx.delay)
+            with self.__sched_cond:
+                self.__sched.push((self.ENTRY_RETRY,exec_id),TaskClock.MonoTs() + ctx.delay,(self.ENTRY_RETRY,task,tm))
+                self.__sched_cond.notify()
+            return
+        
+        self.__exec_pop(exec_id)
+        self.__release(task=task,done=ctx.done)
+    
+    
+    def __on_attempt_timeout(self,task:BaseTask,exec_id:int) -> bool:
+        """
+        线程任务超时,设置取消标记并脱离仍在运行的线程,需持有调度锁
+        
+        超时的尝试由调用方在释放调度锁后按失败处理
+        
+        :param task: BaseTask 任务类
+        :param exec_id: int 执行ID
+        :return: bool 是否超时
+        """
+        with self.__exec_lock:
+            ctx = self.__executions.get(exec_id)
+        if ctx == None or ctx.cancel == None:
+            return False
+        
+        ctx.cancel.set()
+        ctx.cancel = None
+        StatManager(task=task).stat_timeout(stuck=True)
+        return True
+    
+    
+    def __report_timeout(self,task:BaseTask):
+        """
+        通知线程任务超时,超时的线程仍在运行
+        
+        :param task: BaseTask 任务类
+        """
+        task.logsend("task %s timeout after %ss, worker thread detached" % (task.name(),task.timeout()))
+    
+    
+    def __retry_delay(self,task:BaseTask,attempt:int,prev:float) -> float:
+        """
+        计算第 attempt 次失败后的重试间隔
+        
+        :param task: BaseTask 任务类
+        :param attempt: int 已失败次数
+        :param prev: float 上一次重试间隔
+        :return: float 秒
+        """
+        base = task.try_after() or 0
+        backoff = task.backoff()
+        if backoff == BaseTask.BACKOFF_EXPONENTIAL:
+            delay = base * 2 ** (attempt - 1)
+        elif backoff == BaseTask.BACKOFF_DECORRELATED:
+            delay = random.uniform(base,max(prev,base) * 3)
         else:
-            tmout = task.timeout()
+            delay = base
+        
+        cap = task.backoff_max()
+        if cap != None and delay > cap:
+            delay = cap
+        return delay
+    
+    
+    def __acquire(self,task:BaseTask,tm:datetime.datetime,done=None) -> bool:
+        """
+        占用一个执行名额,达到 max_instances 时按 overlap 处理本次执行
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :param done: callable 执行结束后的回调
+        :return: bool 是否可以立即执行
+        """
+        name = task.name()
+        limit = task.max_instances()
+        cancel = []
+        skipped = []
+        with self.__inflight_lock:
+            count = self.__inflight.get(name,0)
+            if not limit or count < limit:
+                self.__inflight[name] = count + 1
+                return True
+            
+            overlap = task.overlap()
+            if overlap in (BaseTask.OVERLAP_QUEUE_ONE,BaseTask.OVERLAP_CANCEL_PREVIOUS):
+                # 只保留最新的一次,被替换的计为跳过
+                replaced = self.__pending.get(name)
+                if replaced != None:
+                    skipped.append(replaced[1])
+                self.__pending[name] = (tm,done)
+                if overlap == BaseTask.OVERLAP_CANCEL_PREVIOUS:
+                    cancel = list(self.__running.get(name,()))
+            else:
+                skipped.append(done)
         
-        # 使用重试方法执行任务
-        task_id = retry(tries=task.trytimes(),delay=task.try_after(),max_delay=tmout)(self.__task_call_back,task=task,tm=tm)
-        del self.__task_ids[task_id]
+        # 取消的执行结束后由 __release 启动等待的一次
+        for future in cancel:
+            future.cancel()
+        if overlap == BaseTask.OVERLAP_CANCEL_PREVIOUS:
+            self.__cancel_executions(task)
+        if skipped:
+            StatManager(task=task).stat_skipped(count=len(skipped))
+        for cb in skipped:
+            if cb != None:
+                cb()
+        return False
+    
+    
+    def __cancel_executions(self,task:BaseTask):
+        """
+        取消线程任务进行中的执行,用于 OVERLAP_CANCEL_PREVIOUS 和移除任务
+        
+        正在运行的尝试设置 cancel 标记,线程无法强制结束,run 检查 cancel 后尽快返回,结束后不再重试;
+        等待重试的执行直接结束。执行结束后由 __release 启动等待的一次
+        
+        :param task: BaseTask 任务类
+        """
+        name = task.name()
+        with self.__exec_lock:
+            ctxs = [ctx for ctx in self.__executions.values() if ctx.task.name() == name]
+        
+        for ctx in ctxs:
+            with self.__sched_cond:
+                cancel = ctx.cancel
+                if cancel != None:
+                    cancel.set()
+                    continue
+                waiting = self.__sched.cancel((self.ENTRY_RETRY,ctx.id))
+            if waiting and self.__exec_pop(ctx.id) != None:
+                self.__release(task=task,done=ctx.done)
+    
+    
+    def __release(self,task:BaseTask,done=None,future=None):
+        """
+        释放执行名额,有等待的执行时提交执行
+        
+        :param task: BaseTask 任务类
+        :param done: callable 执行结束后的回调
+        :param future: Future 结束的协程或进程执行
+        """
+        name = task.name()
+        with self.__inflight_lock:
+            count = self.__inflight.get(name,0) - 1
+            if count > 0:
+                self.__inflight[name] = count
+            else:
+                self.__inflight.pop(name,None)
+            if future != None and name in self.__running:
+                self.__running[name].discard(future)
+                if not self.__running[name]:
+                    del self.__running[name]
+            pending = self.__pending.pop(name,None)
+        
+        self.__activity.set()
+        if done != None:
+            done()
+        if pending != None:
+            self.__submit(self.__run_task,task=task,tm=pending[0],done=pending[1])
+    
+    
+    async def __run_async_task(self,task:BaseTask,tm:datetime.datetime):
+        """
+        在事件循环上执行协程或进程任务,重试间隔使用 asyncio.sleep,不阻塞其他任务
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        """
+        ctx = self.__exec_new(task=task,tm=tm)
+        tries = max(task.trytimes(),1)
+        try:
+            while ctx.attempt < tries:
+                ctx.attempt += 1
+                try:
+                    await self.__async_call_back(task=task,ctx=ctx)
+                    return
+                except Exception:
+                    if ctx.attempt >= tries:
+                        return
+                    ctx.delay = self.__retry_delay(task=task,attempt=ctx.attempt,prev=ctx.delay)
+                    await asyncio.sleep(ctx.delay)
+        finally:
+            self.__exec_pop(ctx.id)
     
     
     def run_sed_loop_tasks(self,):
         """
-        运行时间循环任务
+        把时间循环任务加入截止时间调度,需持有调度锁
         
         :return:
         """
-        for task in self.__task_table.__loop_tasks:
-            self.__pool.submit(self.__run_loop_task_with_retry,task=task)
+        for task in self.__task_table.range_sed_loop_task():
+            self.__loop_names.add(task.name())
+            self.__arm_task(task)
     
     
-    def __run_loop_task_with_retry(self,task:BaseTask):
+    def __run_loop_task(self,task:BaseTask,tm:datetime.datetime):
         """
-        运行一个循环任务执行函数
+        运行一次循环任务,固定间隔的循环任务在执行结束后重新加入调度
+        
+        只在执行期间占用工作线程
         
         :param task: BaseTask 任务类
-        :param tm: 当前时间
+        :param tm: datetime 本次执行时间
         """
-        if not task.timeout():
-                tmout = None
+        if task.loop_mode() == BaseTask.LOOP_FIXED_RATE:
+            self.__run_task(task=task,tm=tm)
         else:
-            tmout = task.timeout()
+            self.__run_task(task=task,tm=tm,done=functools.partial(self.__rearm_loop_task,task))
+    
+    
+    def __rearm_loop_task(self,task:BaseTask):
+        """
+        固定间隔的循环任务执行结束后重新加入调度
         
-        while True:
-            sleep(task.loop_sed())
-            
-            # 使用重试方法执行任务
-            tm = datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE))
-            task_id = retry(tries=task.trytimes(),delay=task.try_after(),max_delay=tmout)(self.__task_call_back,task=task,tm=tm)
-            del self.__task_ids[task_id]
+        :param task: BaseTask 任务类
+        """
+        with self.__sched_cond:
+            self.__arm_task(task)
+            self.__sched_cond.notify()
+    
+    
+    def __run_ms_loop_task(self,task:BaseTask,tm:datetime.datetime,deadline:float):
+        """
+        运行一次毫秒循环任务,记录开始时间相对执行点的抖动
         
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行点时间
+        :param deadline: float 执行点(单调时钟)
+        """
+        StatManager(task=task).stat_jitter(jitter=TaskClock.MonoTs() - deadline)
+        self.__run_task(task=task,tm=tm)
+    
     
     # TODO 内存,cpu 消耗计算,异常日志记录
-    def __task_call_back(self,task:BaseTask,tm=datetime.datetime):
+    def __task_call_back(self,task:BaseTask,ctx:ExecContext,cancel:threading.Event=None):
         """
         运行一个任务执行函数
         
         :param task: BaseTask 任务类
-        :param tm: 当前时间
+        :param ctx: ExecContext 执行上下文
+        :param cancel: threading.Event 超时取消标记
         """
-        # 任务ID标记
-        task_id = "%s_%s" % (str(tm),task.name())
-        task_id = md5(task_id.encode(encoding="utf-8")).hexdigest()
-        
-        # 任务重试判断
-        if task_id in self.__task_ids:
-            rety = True
-        else:
-            rety = False
-            self.__task_ids[rety] = True
+        tm = ctx.tm
         
         # 任务执行
         ok = False
         msg = ""
+        start_ns = TaskClock.PerfNs()
+        ctx.end_ns = 0
+        ctx.start_ns = start_ns
+        ins = None
+        failed = False
         try:
-            ins = object.__new__(task)
-            ok = ins.run(tm=tm)
+            ins = self.__instances.acquire(task)
+            ok = ins.run(**RunKwargs(ins.run,tm=tm,cancel=cancel))
             if ok :
                 ins.after()
         except Exception as e:
             msg = str(e)
+            failed = True
             raise e
         finally:
-            # 执行记录
-            self.__task_stat.stat(
+            # 执行记录,耗时使用单调时钟,不受系统时间跳变影响
+            end_ns = TaskClock.PerfNs()
+            if ins != None:
+                self.__instances.release(task=task,ins=ins,failed=failed)
+            # 超时后被脱离的尝试已按超时统计,不再记录结果,也不覆盖正在进行的重试的计时
+            if cancel == None or ctx.cancel is cancel:
+                ctx.end_ns = end_ns
+                StatManager(task=task).stat(
+                    success=ok,
+                    st=tm,
+                    ed=TaskClock.Now(),
+                    mem=0,
+                    cpu=0,
+                    rety=ctx.attempt > 1,
+                    msg=msg,
+                    cost=(end_ns - start_ns) / 1e9
+                )
+    
+    
+    async def __async_call_back(self,task:BaseTask,ctx:ExecContext):
+        """
+        运行一次协程或进程任务,超时使用 asyncio.wait_for
+        
+        进程任务只传回 (是否成功,错误信息,耗时) 记录
+        
+        :param task: BaseTask 任务类
+        :param ctx: ExecContext 执行上下文
+        """
+        tm = ctx.tm
+        ok = False
+        msg = ""
+        ctx.end_ns = 0
+        ctx.start_ns = TaskClock.PerfNs()
+        cost = None
+        pool = None
+        try:
+            if self.__executor(task) == BaseTask.EXECUTOR_PROCESS:
+                pool = self.__get_process_pool()
+                call = asyncio.get_running_loop().run_in_executor(pool,ProcessCall,task,tm.timestamp())
+                ok,msg,cost = await asyncio.wait_for(call,timeout=task.timeout() or None)
+                if msg:
+                    raise RuntimeError(msg)
+            else:
+                ok = await asyncio.wait_for(self.__async_body(task=task,tm=tm),timeout=task.timeout() or None)
+        except asyncio.TimeoutError:
+            msg = "timeout after %ss" % task.timeout()
+            StatManager(task=task).stat_timeout()
+            # 进程中的任务无法取消,终止并替换整个进程池,不占用线程池避免被拒绝
+            if pool != None:
+                threading.Thread(target=self.__replace_process_pool,args=(pool,),name="TaskTimerProcessReplace",daemon=True).start()
+            raise
+        except asyncio.CancelledError:
+            msg = "cancelled"
+            raise
+        except Exception as e:
+            msg = str(e)
+            raise
+        finally:
+            ctx.end_ns = TaskClock.PerfNs()
+            if cost == None:
+                cost = (ctx.end_ns - ctx.start_ns) / 1e9
+            StatManager(task=task).stat(
                 success=ok,
                 st=tm,
-                ed=datetime.datetime.now(tz=pytz.timezone(bdpyconsts.TIME_ZONE)),
+                ed=TaskClock.Now(),
                 mem=0,
                 cpu=0,
-                rety=rety,
-                msg=msg
+                rety=ctx.attempt > 1,
+                msg=msg,
+                cost=cost
             )
+    
+    
+    async def __async_body(self,task:BaseTask,tm:datetime.datetime) -> bool:
+        """
+        按 lifecycle 获取实例,依次执行 run 和 after,同步的一方放到工作线程执行
+        
+        :param task: BaseTask 任务类
+        :param tm: datetime 执行时间
+        :return: bool 是否执行成功
+        """
+        pool = self.__task_pool(task)
+        ins = self.__instances.get(task)
+        if ins == None:
+            ins = object.__new__(task)
+            if task.setup is not BaseTask.setup:
+                await self.__await_call(pool,ins.setup)
+            ins,stale = self.__instances.put(task,ins)
+            self.__async_teardown(pool=pool,instances=stale)
+        
+        failed = True
+        try:
+            ok = await self.__await_call(pool,ins.run,**RunKwargs(ins.run,tm=tm))
+            if ok:
+                await self.__await_call(pool,ins.after)
+            failed = False
+            return ok
+        finally:
+            # 超时取消时也要执行,teardown 作为独立的协程运行
+            self.__async_teardown(pool=pool,instances=self.__instances.finish(task=task,ins=ins,failed=failed))
+    
+    
+    def __async_teardown(self,pool:TaskPool,instances:list):
+        """
+        在事件循环上异步执行实例的 teardown,需在事件循环线程调用
+        
+        :param pool: TaskPool 同步 teardown 使用的线程池
+        :param instances: list 实例列表
+        """
+        for ins in instances:
+            if type(ins).teardown is not BaseTask.teardown:
+                asyncio.ensure_future(self.__await_teardown(pool=pool,ins=ins))
+    
+    
+    async def __await_teardown(self,pool:TaskPool,ins:BaseTask):
+        """
+        执行一个实例的 teardown,忽略异常
+        
+        :param pool: TaskPool 同步 teardown 使用的线程池
+        :param ins: BaseTask 实例
+        """
+        try:
+            await self.__await_call(pool,ins.teardown)
+        except Exception:
+            pass
+    
+    
+    async def __await_call(self,pool:TaskPool,func,**kwargs):
+        """
+        执行协程函数,或把同步函数放到工作线程执行
         
-        return task_id
\ No newline at end of file
+        :param pool: TaskPool 同步函数使用的线程池
+        :param func: callable 执行函数
+        :param kwargs: dict 执行参数
+        :return: 执行结果
+        """
+        if asyncio.iscoroutinefunction(func):
+            return await func(**kwargs)
+        res = await asyncio.get_running_loop().run_in_executor(pool,functools.partial(func,**kwargs))
+        if inspect.isawaitable(res):
+            res = await res
+        return res
+
+
+@functools.lru_cache(maxsize=1024)
+def _accepts_cancel(func) -> bool:
+    """
+    函数是否接受 cancel 参数
+    
+    :param func: callable 函数
+    :return: bool 声明了 cancel 或 **kwargs
+    """
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError,ValueError):
+        return False
+    return any(p.kind == p.VAR_KEYWORD or p.name == "cancel" for p in params)
+
+
+def RunKwargs(run,tm:datetime.datetime,cancel:threading.Event=None) -> dict:
+    """
+    run 的调用参数,只在 run 接受时传入取消标记,兼容 def run(self,tm) 形式的任务
+    
+    :param run: callable 任务实例的 run
+    :param tm: datetime 执行时间
+    :param cancel: threading.Event 超时取消标记
+    :return: dict
+    """
+    kwargs = {"tm":tm}
+    if cancel != None and _accepts_cancel(getattr(run,"__func__",run)):
+        kwargs["cancel"] = cancel
+    return kwargs
+
+
+# 工作进程中按 lifecycle 复用的任务实例
+_PROCESS_INSTANCES = InstanceCache()
+
+
+def ProcessCall(task:BaseTask,ts:float) -> tuple:
+    """
+    在工作进程中运行一次任务,只返回紧凑的执行记录
+    
+    LIFECYCLE_THREAD 和 LIFECYCLE_SINGLETON 的实例在每个工作进程中复用
+    
+    :param task: BaseTask 任务类
+    :param ts: float 执行时间戳
+    :return: tuple (是否成功,错误信息,耗时秒数)
+    """
+    ok = False
+    msg = ""
+    st = TaskClock.PerfNs()
+    ins = None
+    try:
+        ins = _PROCESS_INSTANCES.acquire(task)
+        ok = ins.run(**RunKwargs(ins.run,tm=TaskClock.FromTs(ts)))
+        if ok:
+            ins.after()
+    except Exception as e:
+        msg = str(e) or e.__class__.__name__
+    cost = (TaskClock.PerfNs() - st) / 1e9
+    if ins != None:
+        _PROCESS_INSTANCES.release(task=task,ins=ins,failed=bool(msg))
+    return (bool(ok),msg,cost)
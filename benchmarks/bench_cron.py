@@ -0,0 +1,163 @@
+# 定时表达式基准测试
+'''
+按表达式类型统计解析和命中判断的耗时与内存分配
+
+*       每个时间点
+a,b     指定某些时间点
+a-b     指定时间范围的每个时间点
+n/*     在时间范围内要求执行n次
+n/a-b   在指定时间范围内要求执行n次
+a,b/c-d 在指定时间范围内的指定时间点
+
+python benchmarks/bench_cron.py --tasks 10,100,1000,10000,100000 --json cron.json
+'''
+import argparse,datetime,random
+
+from benchlib import alloc_op,time_op,write_json
+
+from TaskCron import IsTimeHit,CompiledCron,CompileCron,Cron,Year,Month,Day,Week,Hour,Minute,Second
+
+# 各类型的秒字段表达式,其余字段为 *
+FAMILIES = {
+    "*":"*",
+    "a,b":"0,15,30,45",
+    "a-b":"10-40",
+    "n/*":"6/*",
+    "n/a-b":"4/0-39",
+    "a,b/c-d":"5,10,50/0-30",
+}
+
+# 时间单元
+UNITS = (Year,Month,Day,Week,Hour,Minute,Second)
+
+
+def expression(family:str) -> str:
+    """
+    构造只有秒字段不同的完整表达式
+    
+    :param family: str 表达式类型
+    :return: str
+    """
+    return "* * * * * * %s" % FAMILIES[family]
+
+
+def sample_times(count:int,seed:int=1) -> list:
+    """
+    生成随机时间,避免命中判断复用上一次结果
+    
+    :param count: int 数量
+    :param seed: int 随机种子
+    :return: list[datetime]
+    """
+    rnd = random.Random(seed)
+    base = datetime.datetime(2026,1,1)
+    return [base + datetime.timedelta(seconds=rnd.randint(0,86400 * 365)) for _ in range(count)]
+
+
+def bench_family(family:str,number:int) -> list:
+    """
+    单个表达式类型的解析和命中判断
+    
+    :param family: str 表达式类型
+    :param number: int 每项执行次数
+    :return: list
+    """
+    con = expression(family)
+    field = FAMILIES[family]
+    cron = CompiledCron(con)
+    times = sample_times(number)
+    it = None
+    
+    def parse_field():
+        croner = Cron()
+        croner.load(field)
+        croner.parse(0,59)
+    
+    def parse_units():
+        tm = times[0]
+        for unit,v in zip(UNITS,con.split(" ")):
+            unit(tm=tm).parse(v)
+    
+    cases = {
+        "parse_field":parse_field,
+        "parse_units":parse_units,
+        "compile":lambda: CompiledCron(con),
+        "compile_cached":lambda: CompileCron(con),
+        "match_legacy":lambda: IsTimeHit(con,next(it)),
+        "match_compiled":lambda: cron.matches(next(it)),
+        "next_fire_time":lambda: cron.next_fire_time(next(it)),
+    }
+    
+    results = []
+    for name,op in cases.items():
+        it = iter(times * 3)
+        record = {"bench":name,"family":family,"tasks":1,"ns_per_op":time_op(op,number)}
+        it = iter(times * 3)
+        record.update(alloc_op(op))
+        results.append(record)
+    return results
+
+
+def bench_tasks(count:int,legacy_max:int) -> list:
+    """
+    一个刻度内判断全部任务的耗时
+    
+    :param count: int 任务数
+    :param legacy_max: int IsTimeHit 最多测试的任务数
+    :return: list
+    """
+    rnd = random.Random(count)
+    cons = [expression(rnd.choice(list(FAMILIES))) for _ in range(count)]
+    crons = [CompiledCron(con) for con in cons]
+    # 每个刻度使用不同的时间,不复用上一次结果
+    times = iter(sample_times(10000))
+    
+    def tick_legacy():
+        tm = next(times)
+        for con in cons:
+            IsTimeHit(con,tm)
+    
+    def tick_compiled():
+        tm = next(times)
+        for cron in crons:
+            cron.matches(tm)
+    
+    cases = {"tick_compiled":tick_compiled}
+    if count <= legacy_max:
+        cases["tick_legacy"] = tick_legacy
+    
+    results = []
+    for name,op in cases.items():
+        ns = time_op(op,max(1,1000 // count))
+        record = {"bench":name,"family":"mixed","tasks":count,"ns_per_op":ns / count,"ns_per_tick":ns}
+        record.update(alloc_op(op))
+        results.append(record)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定时表达式基准测试")
+    parser.add_argument("--tasks",default="10,100,1000,10000,100000",help="任务数,逗号分隔")
+    parser.add_argument("--number",type=int,default=2000,help="单项执行次数")
+    parser.add_argument("--legacy-max",type=int,default=10000,help="IsTimeHit 最多测试的任务数")
+    parser.add_argument("--json",default="",help="JSON 输出路径,- 为标准输出")
+    args = parser.parse_args()
+    
+    results = []
+    for family in FAMILIES:
+        results.extend(bench_family(family,args.number))
+    for count in [int(v) for v in args.tasks.split(",")]:
+        results.extend(bench_tasks(count,args.legacy_max))
+    
+    if args.json:
+        write_json("cron",results,args.json)
+        if args.json == "-":
+            return
+    
+    print("%-16s %-8s %8s %12s %12s" % ("bench","family","tasks","ns_per_op","alloc_peak_b"))
+    for r in results:
+        print("%-16s %-8s %8d %12.0f %12d" % (r["bench"],r["family"],r["tasks"],r["ns_per_op"],r["alloc_peak_b"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# 执行方式基准测试
+'''
+对比线程池和进程池执行任务的开销
+
+pickle      进程任务每次执行需要序列化的参数 (任务类,执行时间戳) 和传回的执行记录
+roundtrip   空任务提交到返回的往返耗时
+cpu         CPU 密集任务批量执行的总耗时
+
+python benchmarks/bench_executor.py --tasks 8,32 --work 200000 --json executor.json
+'''
+import argparse,multiprocessing,os,pickle,time
+
+from benchlib import time_op,write_json
+
+from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor
+from TaskFactory import BaseTask
+from TaskTimer import ProcessCall
+
+
+class NoopTask(BaseTask):
+    run_type = staticmethod(lambda: BaseTask.TASK_RUN_SINGLE)
+    shcd_con = staticmethod(lambda: None)
+    loop_sed = staticmethod(lambda: None)
+    single_tm = staticmethod(lambda: None)
+    name = staticmethod(lambda: "bench_noop")
+    alias = staticmethod(lambda: "bench_noop")
+    timeout = staticmethod(lambda: 0)
+    trytimes = staticmethod(lambda: 1)
+    try_after = staticmethod(lambda: 0)
+    logsend = staticmethod(lambda msg: None)
+    emails = staticmethod(lambda: [])
+    logfile = staticmethod(lambda: "")
+    logsuccess = staticmethod(lambda: False)
+    logfield = staticmethod(lambda: False)
+    logabnormal = staticmethod(lambda: False)
+    
+    def run(self,**kwargs) -> bool:
+        return True
+
+
+class CpuTask(NoopTask):
+    # CPU 密集任务的循环次数,由 --work 设置,子进程通过环境变量读取
+    work = int(os.environ.get("BENCH_EXECUTOR_WORK","200000"))
+    
+    name = staticmethod(lambda: "bench_cpu")
+    alias = staticmethod(lambda: "bench_cpu")
+    
+    def run(self,**kwargs) -> bool:
+        total = 0
+        for i in range(CpuTask.work):
+            total += i * i
+        return total >= 0
+
+
+def make_process_pool(workers:int) -> ProcessPoolExecutor:
+    """
+    按 TaskTimer 的方式创建并预热进程池
+    
+    :param workers: int 工作进程数
+    :return: ProcessPoolExecutor
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+    else:
+        ctx = multiprocessing.get_context()
+    pool = ProcessPoolExecutor(max_workers=workers,mp_context=ctx)
+    for f in [pool.submit(os.getpid) for _ in range(workers)]:
+        f.result()
+    return pool
+
+
+def bench_pickle(number:int) -> list:
+    """
+    进程任务参数和执行记录的序列化开销
+    
+    :param number: int 执行次数
+    :return: list
+    """
+    args = (NoopTask,time.time())
+    result = (True,"",0.001)
+    
+    results = []
+    for name,data in (("pickle_args",args),("pickle_result",result)):
+        ns = time_op(lambda: pickle.loads(pickle.dumps(data)),number)
+        results.append({"bench":name,"executor":"process","tasks":1,"ns_per_op":ns,"bytes":len(pickle.dumps(data))})
+    return results
+
+
+def bench_roundtrip(pool,executor:str,number:int) -> dict:
+    """
+    空任务提交到返回的往返耗时
+    
+    :param pool: Executor 执行池
+    :param executor: str thread|process
+    :param number: int 执行次数
+    :return: dict
+    """
+    ts = time.time()
+    ns = time_op(lambda: pool.submit(ProcessCall,NoopTask,ts).result(),number)
+    return {"bench":"roundtrip","executor":executor,"tasks":1,"ns_per_op":ns,"bytes":0}
+
+
+def bench_cpu(pool,executor:str,count:int) -> dict:
+    """
+    同时提交一批 CPU 密集任务,统计全部完成的耗时
+    
+    :param pool: Executor 执行池
+    :param executor: str thread|process
+    :param count: int 任务数
+    :return: dict
+    """
+    ts = time.time()
+    st = time.perf_counter_ns()
+    for f in [pool.submit(ProcessCall,CpuTask,ts) for _ in range(count)]:
+        f.result()
+    ns = time.perf_counter_ns() - st
+    return {"bench":"cpu","executor":executor,"tasks":count,"ns_per_op":ns / count,"bytes":0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="执行方式基准测试")
+    parser.add_argument("--tasks",default="8,32",help="CPU 密集任务数,逗号分隔")
+    parser.add_argument("--work",type=int,default=200000,help="CPU 密集任务的循环次数")
+    parser.add_argument("--number",type=int,default=2000,help="单项执行次数")
+    parser.add_argument("--workers",type=int,default=os.cpu_count() or 1,help="线程数和进程数")
+    parser.add_argument("--json",default="",help="JSON 输出路径,- 为标准输出")
+    args = parser.parse_args()
+    
+    os.environ["BENCH_EXECUTOR_WORK"] = str(args.work)
+    CpuTask.work = args.work
+    
+    results = bench_pickle(args.number)
+    pools = {
+        "thread":ThreadPoolExecutor(max_workers=args.workers),
+        "process":make_process_pool(args.workers),
+    }
+    for executor,pool in pools.items():
+        results.append(bench_roundtrip(pool,executor,max(1,args.number // 10)))
+        for count in [int(v) for v in args.tasks.split(",")]:
+            results.append(bench_cpu(pool,executor,count))
+        pool.shutdown()
+    
+    if args.json:
+        write_json("executor",results,args.json)
+        if args.json == "-":
+            return
+    
+    print("%-14s %-8s %8s %12s %8s" % ("bench","executor","tasks","ns_per_op","bytes"))
+    for r in results:
+        print("%-14s %-8s %8d %12.0f %8d" % (r["bench"],r["executor"],r["tasks"],r["ns_per_op"],r["bytes"]))
+
+
+if __name__ == "__main__":
+    main()
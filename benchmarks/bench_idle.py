@@ -0,0 +1,125 @@
+# 空闲唤醒基准测试
+'''
+统计没有到期任务时定时器各线程的唤醒次数,每种调度模式在独立子进程中运行
+
+TICK        每秒心跳,日志打印每秒唤醒
+HEAP        最小堆截止时间调度,日志打印每秒唤醒
+WHEEL       分层时间轮截止时间调度,日志打印每秒唤醒
+TICKLESS    无心跳,所有后台线程阻塞在事件或最近的截止时间上
+
+唤醒次数按 /proc/<pid>/task/<tid>/status 的上下文切换次数统计(不含主线程),只支持 Linux
+
+python benchmarks/bench_idle.py --modes TICK,HEAP,TICKLESS --seconds 30 --json idle.json
+'''
+import argparse,json,os,subprocess,sys,threading,time
+
+from benchlib import write_json
+
+from TaskFactory import BaseTask
+
+
+class IdleTask(BaseTask):
+    # 一天执行一次,测量期间不会到期
+    run_type = staticmethod(lambda: BaseTask.TASK_RUN_SECOND_LOOP)
+    shcd_con = staticmethod(lambda: None)
+    loop_sed = staticmethod(lambda: 86400)
+    single_tm = staticmethod(lambda: None)
+    name = staticmethod(lambda: "bench_idle")
+    alias = staticmethod(lambda: "bench_idle")
+    timeout = staticmethod(lambda: 0)
+    trytimes = staticmethod(lambda: 1)
+    try_after = staticmethod(lambda: 0)
+    logsend = staticmethod(lambda msg: None)
+    emails = staticmethod(lambda: [])
+    logfile = staticmethod(lambda: "")
+    logsuccess = staticmethod(lambda: False)
+    logfield = staticmethod(lambda: False)
+    logabnormal = staticmethod(lambda: False)
+    
+    def run(self,**kwargs) -> bool:
+        return True
+
+
+def thread_switches() -> dict:
+    """
+    当前进程各线程(不含主线程)的上下文切换次数
+    
+    :return: dict {线程ID:次数}
+    """
+    res = {}
+    pid = os.getpid()
+    for tid in os.listdir("/proc/self/task"):
+        if int(tid) == pid:
+            continue
+        try:
+            with open("/proc/self/task/%s/status" % tid) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        res[tid] = sum(int(line.split()[1]) for line in lines if "ctxt_switches:" in line)
+    return res
+
+
+def measure(mode:str,seconds:float,warmup:float,console:bool) -> dict:
+    """
+    启动定时器,预热后统计一段时间内的唤醒次数
+    
+    :param mode: str 调度模式
+    :param seconds: float 统计秒数
+    :param warmup: float 预热秒数
+    :param console: bool 是否打开日志打印
+    :return: dict
+    """
+    from TaskTable import TaskTable
+    from TaskTimer import TaskTimer
+    
+    TaskTable.register(IdleTask)
+    timer = TaskTimer(console=console,mode=mode)
+    threading.Thread(target=timer.run,daemon=True).start()
+    time.sleep(warmup)
+    
+    before = thread_switches()
+    time.sleep(seconds)
+    after = thread_switches()
+    
+    wakeups = sum(v - before.get(tid,0) for tid,v in after.items())
+    return {"bench":"idle","mode":mode,"seconds":seconds,"threads":len(after),"wakeups":wakeups,"wakeups_per_sec":wakeups / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空闲唤醒基准测试")
+    parser.add_argument("--modes",default="TICK,HEAP,WHEEL,TICKLESS",help="调度模式,逗号分隔")
+    parser.add_argument("--seconds",type=float,default=10,help="统计秒数")
+    parser.add_argument("--warmup",type=float,default=2,help="预热秒数")
+    parser.add_argument("--console",action="store_true",help="打开日志打印")
+    parser.add_argument("--child",default="",help=argparse.SUPPRESS)
+    parser.add_argument("--json",default="",help="JSON 输出路径,- 为标准输出")
+    args = parser.parse_args()
+    
+    # 子进程只测一种模式,定时器是单例
+    if args.child:
+        res = measure(args.child,args.seconds,args.warmup,args.console)
+        sys.stdout.write("\n" + json.dumps(res) + "\n")
+        sys.stdout.flush()
+        os._exit(0)
+    
+    results = []
+    for mode in args.modes.split(","):
+        cmd = [sys.executable,os.path.abspath(__file__),"--child",mode,"--seconds",str(args.seconds),"--warmup",str(args.warmup)]
+        if args.console:
+            cmd.append("--console")
+        out = subprocess.run(cmd,capture_output=True,text=True,check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    
+    if args.json:
+        write_json("idle",results,args.json)
+        if args.json == "-":
+            return
+    
+    print("%-10s %8s %8s %10s %14s" % ("mode","seconds","threads","wakeups","wakeups_per_sec"))
+    for r in results:
+        print("%-10s %8.0f %8d %10d %14.2f" % (r["mode"],r["seconds"],r["threads"],r["wakeups"],r["wakeups_per_sec"]))
+
+
+if __name__ == "__main__":
+    main()
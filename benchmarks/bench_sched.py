@@ -0,0 +1,149 @@
+# 调度结构基准测试
+'''
+对比三种调度方式在大量任务下的开销
+poll    现有的每秒轮询,每个刻度遍历全部任务
+        (只做到期判断,不含每个任务提交线程池的开销,是轮询方式的下限)
+heap    最小堆截止时间调度
+wheel   分层时间轮截止时间调度
+
+python benchmarks/bench_sched.py --tasks 1000,10000,100000 --seconds 600 --json sched.json
+'''
+import argparse,random,time,tracemalloc
+
+from benchlib import write_json
+
+from TaskSched import HeapScheduler,WheelScheduler
+
+# 模拟起始时间
+_START = 1700000000.0
+
+
+def make_tasks(count:int,seed:int=1) -> list:
+    """
+    生成模拟任务 [(键,首次截止时间,循环间隔)]
+    
+    :param count: int 任务数
+    :param seed: int 随机种子
+    :return: list
+    """
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(count):
+        interval = rnd.choice((1,5,30,60,300,3600,86400))
+        tasks.append((i,_START + rnd.random() * interval,interval))
+    return tasks
+
+
+def bench_poll(tasks:list,seconds:int) -> dict:
+    """
+    每秒遍历全部任务判断是否到期
+    
+    :param tasks: list 模拟任务
+    :param seconds: int 模拟秒数
+    :return: dict
+    """
+    nexts = {key:deadline for key,deadline,_ in tasks}
+    intervals = {key:interval for key,_,interval in tasks}
+    fired = 0
+    st = time.perf_counter()
+    for tick in range(1,seconds + 1):
+        now = _START + tick
+        for key,deadline in nexts.items():
+            if deadline <= now:
+                nexts[key] = deadline + intervals[key]
+                fired += 1
+    run = time.perf_counter() - st
+    return {"insert_ns":0,"cancel_ns":0,"run_s":run,"fired":fired}
+
+
+def bench_deadline(sched,tasks:list,seconds:int) -> dict:
+    """
+    截止时间调度,每秒只弹出到期任务并重新加入
+    
+    :param sched: HeapScheduler|WheelScheduler 调度结构
+    :param tasks: list 模拟任务
+    :param seconds: int 模拟秒数
+    :return: dict
+    """
+    st = time.perf_counter_ns()
+    for key,deadline,interval in tasks:
+        sched.push(key,deadline,interval)
+    insert_ns = (time.perf_counter_ns() - st) / len(tasks)
+    
+    fired = 0
+    st = time.perf_counter()
+    for tick in range(1,seconds + 1):
+        now = _START + tick
+        for deadline,key,interval in sched.pop_due(now):
+            sched.push(key,deadline + interval,interval)
+            fired += 1
+    run = time.perf_counter() - st
+    
+    st = time.perf_counter_ns()
+    for key,_,_ in tasks:
+        sched.cancel(key)
+    cancel_ns = (time.perf_counter_ns() - st) / len(tasks)
+    
+    return {"insert_ns":insert_ns,"cancel_ns":cancel_ns,"run_s":run,"fired":fired}
+
+
+def measure(name:str,tasks:list,seconds:int) -> dict:
+    """
+    运行一种调度方式,计时和内存分两次测量,避免 tracemalloc 影响计时
+    
+    :param name: str poll|heap|wheel
+    :param tasks: list 模拟任务
+    :param seconds: int 模拟秒数
+    :return: dict
+    """
+    def build():
+        if name == "heap":
+            return HeapScheduler()
+        return WheelScheduler(start=_START)
+    
+    if name == "poll":
+        result = bench_poll(tasks,seconds)
+    else:
+        result = bench_deadline(build(),tasks,seconds)
+    
+    # 只统计调度结构本身保存全部任务时的内存
+    tracemalloc.start()
+    if name == "poll":
+        keep = ({key:deadline for key,deadline,_ in tasks},{key:interval for key,_,interval in tasks})
+    else:
+        keep = build()
+        for key,deadline,interval in tasks:
+            keep.push(key,deadline,interval)
+    result["mem_kb"] = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    del keep
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="调度结构基准测试")
+    parser.add_argument("--tasks",default="1000,10000,100000",help="任务数,逗号分隔")
+    parser.add_argument("--seconds",type=int,default=600,help="模拟秒数")
+    parser.add_argument("--json",default="",help="JSON 输出路径,- 为标准输出")
+    args = parser.parse_args()
+    
+    results = []
+    for count in [int(v) for v in args.tasks.split(",")]:
+        tasks = make_tasks(count)
+        for name in ("poll","heap","wheel"):
+            r = measure(name,tasks,args.seconds)
+            r.update({"mode":name,"tasks":count,"seconds":args.seconds})
+            results.append(r)
+    
+    if args.json:
+        write_json("sched",results,args.json)
+        if args.json == "-":
+            return
+    
+    print("%-6s %8s %10s %10s %10s %10s %10s" % ("mode","tasks","insert_ns","cancel_ns","run_s","fired","mem_kb"))
+    for r in results:
+        print("%-6s %8d %10.0f %10.0f %10.3f %10d %10.0f" % (r["mode"],r["tasks"],r["insert_ns"],r["cancel_ns"],r["run_s"],r["fired"],r["mem_kb"]))
+
+
+if __name__ == "__main__":
+    main()
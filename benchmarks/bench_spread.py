@@ -0,0 +1,101 @@
+# 执行密度报告
+'''
+统计一批定时任务每秒的执行数,对比按 spread 错开前后的分布
+
+before  按表达式的时间点执行
+after   每个任务按名称的稳定哈希在 [0,spread) 内后移
+
+python benchmarks/bench_spread.py --tasks 500 --spread 30 --hours 1 --json spread.json
+python benchmarks/bench_spread.py --cron "* * * * * * 0-0" --cron "* * * * * 0-0 0-0" --spread 10
+'''
+import argparse,collections,datetime
+
+from benchlib import write_json
+
+from TaskCron import CompileCron,IterFireStamps,SpreadOffset
+
+# 默认的表达式,都集中在第 0 秒附近
+CRONS = [
+    "* * * * * * 0-0",
+    "* * * * * 0-0 0-0",
+    "* * * * * * 0,30",
+    "* * * * * 0,15,30,45 0-0",
+]
+
+
+def density(crons:list,offsets:list,start:datetime.datetime,end:datetime.datetime) -> collections.Counter:
+    """
+    每秒的执行数
+    
+    :param crons: list[CompiledCron] 定时表达式
+    :param offsets: list[float] 各表达式的偏移秒数
+    :param start: datetime 开始时间(含)
+    :param end: datetime 结束时间(不含)
+    :return: Counter {秒级时间戳:执行数}
+    """
+    counter = collections.Counter()
+    for ts,i in IterFireStamps(crons,start=start,end=end):
+        counter[int(ts + offsets[i])] += 1
+    return counter
+
+
+def report(name:str,counter:collections.Counter,seconds:int) -> dict:
+    """
+    执行密度统计
+    
+    :param name: str before|after
+    :param counter: Counter 每秒的执行数
+    :param seconds: int 统计的总秒数
+    :return: dict
+    """
+    counts = sorted(counter.values())
+    fires = sum(counts)
+    busy = len(counts)
+    return {
+        "bench":"spread",
+        "mode":name,
+        "fires":fires,
+        "busy_seconds":busy,
+        "busy_ratio":busy / seconds if seconds else 0.0,
+        "max_per_sec":counts[-1] if counts else 0,
+        "p99_per_sec":counts[int(busy * 0.99)] if counts else 0,
+        "avg_per_busy_sec":fires / busy if busy else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="执行密度报告")
+    parser.add_argument("--tasks",type=int,default=500,help="任务数,按顺序轮流使用表达式")
+    parser.add_argument("--cron",action="append",default=[],help="定时表达式,可重复,默认使用集中在第 0 秒的表达式")
+    parser.add_argument("--spread",type=float,default=30,help="错开窗口秒数")
+    parser.add_argument("--hours",type=float,default=1,help="统计小时数")
+    parser.add_argument("--json",default="",help="JSON 输出路径,- 为标准输出")
+    args = parser.parse_args()
+    
+    exprs = args.cron or CRONS
+    names = ["task%d" % i for i in range(args.tasks)]
+    crons = [CompileCron(exprs[i % len(exprs)]) for i in range(args.tasks)]
+    
+    start = datetime.datetime.now().replace(minute=0,second=0,microsecond=0)
+    seconds = int(args.hours * 3600)
+    end = start + datetime.timedelta(seconds=seconds)
+    
+    results = [
+        report("before",density(crons,[0.0] * len(crons),start,end),seconds),
+        report("after",density(crons,[SpreadOffset(name,args.spread) for name in names],start,end),seconds),
+    ]
+    for r in results:
+        r["spread"] = args.spread
+    
+    if args.json:
+        write_json("spread",results,args.json)
+        if args.json == "-":
+            return
+    
+    print("%-8s %8s %10s %8s %12s %12s %16s" % ("mode","fires","busy_secs","busy","max_per_sec","p99_per_sec","avg_per_busy_sec"))
+    for r in results:
+        print("%-8s %8d %10d %7.1f%% %12d %12d %16.2f" % (r["mode"],r["fires"],r["busy_seconds"],r["busy_ratio"] * 100,r["max_per_sec"],r["p99_per_sec"],r["avg_per_busy_sec"]))
+
+
+if __name__ == "__main__":
+    main()
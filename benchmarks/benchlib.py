@@ -0,0 +1,75 @@
+# 基准测试公共方法
+import datetime,json,os,platform,subprocess,sys,time,tracemalloc
+
+# 仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0,ROOT)
+
+
+def time_op(op,number:int) -> float:
+    """
+    重复执行并返回每次耗时
+    
+    :param op: callable 无参函数
+    :param number: int 执行次数
+    :return: float 纳秒/次
+    """
+    st = time.perf_counter_ns()
+    for _ in range(number):
+        op()
+    return (time.perf_counter_ns() - st) / number
+
+
+def alloc_op(op) -> dict:
+    """
+    执行一次并统计内存分配
+    
+    :param op: callable 无参函数
+    :return: dict {"alloc_peak_b":单次执行的峰值分配,"alloc_kept_b":执行后仍占用的内存}
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    op()
+    current,peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"alloc_peak_b":peak - before,"alloc_kept_b":current - before}
+
+
+def git_commit() -> str:
+    """
+    当前提交,用于对比不同提交的结果
+    
+    :return: str
+    """
+    try:
+        out = subprocess.run(["git","rev-parse","--short","HEAD"],cwd=ROOT,capture_output=True,text=True,timeout=10)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def write_json(name:str,results:list,path:str):
+    """
+    输出 JSON 结果
+    
+    :param name: str 基准测试名称
+    :param results: list 结果记录
+    :param path: str 输出文件路径,"-" 输出到标准输出
+    """
+    data = {
+        "bench":name,
+        "commit":git_commit(),
+        "python":platform.python_version(),
+        "platform":platform.platform(),
+        "at":datetime.datetime.now().isoformat(timespec="seconds"),
+        "results":results,
+    }
+    if path == "-":
+        json.dump(data,sys.stdout,ensure_ascii=False,indent=2)
+        print()
+        return
+    with open(path,"w",encoding="utf-8") as f:
+        json.dump(data,f,ensure_ascii=False,indent=2)
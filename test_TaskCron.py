@@ -0,0 +1,122 @@
+# 定时规则测试
+import datetime,random,unittest
+from TaskCron import CompiledCron,IsTimeHit,IterFireStamps,SpreadOffset
+import TaskClock
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
+# 覆盖各种写法的表达式
+EXPRS = [
+    "* * * * * * *",
+    "* * * * * * 0-0",
+    "* * * * 0-0 0-0 0-0",
+    "* * * * * 0,30 10,20",
+    "* * 1,15 * * * 0-0",
+    "* * * 1,3,5 * 0-0 0-0",
+    "* 2-3 * * 1-2 * 30-30",
+    "* * 3/* * * * *",
+    "* * * * 2/0-23 * 0-0",
+    "2027-2027 1-1 1-1 * 0-0 0-0 0-0",
+    "* * 31-31 * 12-12 0-0 0-0",
+]
+
+
+class TestCompiledCron(unittest.TestCase):
+    
+    def setUp(self):
+        self.rnd = random.Random(11)
+    
+    def random_time(self) -> datetime.datetime:
+        return datetime.datetime(2026,1,1) + datetime.timedelta(seconds=self.rnd.randrange(2 * 366 * 86400))
+    
+    def test_matches_agrees_with_is_time_hit(self):
+        for con in EXPRS:
+            cron = CompiledCron(con)
+            for _ in range(300):
+                tm = self.random_time()
+                self.assertEqual(cron.matches(tm=tm),IsTimeHit(con,tm=tm),(con,tm))
+    
+    def test_next_fire_time_agrees_with_is_time_hit(self):
+        for con in EXPRS:
+            cron = CompiledCron(con)
+            for _ in range(20):
+                after = self.random_time()
+                tm = cron.next_fire_time(after=after)
+                if tm == None:
+                    continue
+                self.assertGreater(tm,after)
+                self.assertTrue(IsTimeHit(con,tm=tm),(con,after,tm))
+                # 中间没有漏掉的命中时间,只检查较近的结果
+                if tm - after <= datetime.timedelta(hours=2):
+                    probe = after + datetime.timedelta(seconds=1)
+                    while probe < tm:
+                        self.assertFalse(IsTimeHit(con,tm=probe),(con,probe))
+                        probe += datetime.timedelta(seconds=1)
+                self.assertEqual(cron.prev_fire_time(before=tm + datetime.timedelta(seconds=1)),tm)
+    
+    def test_iter_fire_stamps_merges_in_order(self):
+        crons = [CompiledCron(con) for con in EXPRS[1:6]]
+        start = datetime.datetime(2026,3,1,10,20,5)
+        end = start + datetime.timedelta(hours=30)
+        got = list(IterFireStamps(crons,start=start,end=end))
+        
+        want = []
+        tm = start
+        while tm < end:
+            for i,cron in enumerate(crons):
+                if cron.matches(tm=tm):
+                    want.append((int(TaskClock.Localize(tm).timestamp()),i))
+            tm += datetime.timedelta(seconds=1)
+        self.assertEqual(got,want)
+    
+    def test_runs_today_agrees_with_iter_fire_times(self):
+        cron = CompiledCron("* * * * 0,3,6,9,12,15,18,21 0,30 0-0")
+        day = TaskClock.Localize(datetime.datetime(2026,5,4))
+        fires = list(cron.iter_fire_times(start=day,end=day + datetime.timedelta(days=1)))
+        self.assertEqual(cron.runs_today(day=day),len(fires))
+        self.assertEqual(list(cron.timeline(day=day)),[int(tm.timestamp() - day.timestamp()) for tm in fires])
+    
+    @unittest.skipIf(zoneinfo == None,"zoneinfo unavailable")
+    def test_next_fire_time_skips_dst_gap(self):
+        tz = zoneinfo.ZoneInfo("America/New_York")
+        cron = CompiledCron("* * * * 2-2 0,30 0-0")
+        tm = cron.next_fire_time(after=datetime.datetime(2026,3,8,1,0,tzinfo=tz))
+        self.assertEqual(tm,datetime.datetime(2026,3,9,2,0,tzinfo=tz))
+        tm = cron.prev_fire_time(before=datetime.datetime(2026,3,8,4,0,tzinfo=tz))
+        self.assertEqual(tm,datetime.datetime(2026,3,7,2,30,tzinfo=tz))
+    
+    @unittest.skipIf(zoneinfo == None,"zoneinfo unavailable")
+    def test_fire_time_after_second_occurrence_of_repeated_hour(self):
+        tz = zoneinfo.ZoneInfo("America/New_York")
+        cron = CompiledCron("* * * * * * 0-0")
+        ref = datetime.datetime(2026,11,1,1,30,tzinfo=tz,fold=1)
+        # 重复的时间只在第一次出现时执行
+        tm = cron.next_fire_time(after=ref)
+        self.assertGreater(tm.timestamp(),ref.timestamp())
+        self.assertEqual(tm.timestamp(),datetime.datetime(2026,11,1,2,0,tzinfo=tz).timestamp())
+        tm = cron.prev_fire_time(before=ref)
+        self.assertLess(tm.timestamp(),ref.timestamp())
+        self.assertEqual(tm.timestamp(),datetime.datetime(2026,11,1,1,59,tzinfo=tz).timestamp())
+        # 第一次出现不受影响
+        ref = ref.replace(fold=0)
+        self.assertEqual(cron.next_fire_time(after=ref),datetime.datetime(2026,11,1,1,31,tzinfo=tz))
+        self.assertEqual(cron.prev_fire_time(before=ref),datetime.datetime(2026,11,1,1,29,tzinfo=tz))
+
+
+
+class TestSpreadOffset(unittest.TestCase):
+    
+    def test_stable_and_in_window(self):
+        for i in range(200):
+            offset = SpreadOffset("task%d" % i,30)
+            self.assertGreaterEqual(offset,0)
+            self.assertLess(offset,30)
+            self.assertEqual(offset,SpreadOffset("task%d" % i,30))
+        self.assertEqual(SpreadOffset("task",0),0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# 任务实例缓存测试
+import threading,unittest
+from TaskFactory import BaseTask
+from TaskInstance import InstanceCache
+from testlib import make_task
+
+
+def lifecycle_task(mode:str,log:list) -> type:
+    """
+    创建记录 setup/teardown 的任务类
+    """
+    def setup(self):
+        log.append(("setup",self))
+    
+    def teardown(self):
+        log.append(("teardown",self))
+    
+    return make_task("test_lifecycle_" + mode,methods={"setup":setup,"teardown":teardown},lifecycle=mode)
+
+
+class TestInstanceCache(unittest.TestCase):
+    
+    def test_execution_instances_are_not_reused(self):
+        log = []
+        task = lifecycle_task(BaseTask.LIFECYCLE_EXECUTION,log)
+        cache = InstanceCache()
+        a = cache.acquire(task)
+        cache.release(task,a)
+        b = cache.acquire(task)
+        cache.release(task,b)
+        self.assertIsNot(a,b)
+        self.assertEqual(log,[("setup",a),("teardown",a),("setup",b),("teardown",b)])
+    
+    def test_failed_singleton_is_torn_down_after_last_holder(self):
+        log = []
+        task = lifecycle_task(BaseTask.LIFECYCLE_SINGLETON,log)
+        cache = InstanceCache()
+        a = cache.acquire(task)
+        b = cache.acquire(task)
+        self.assertIs(a,b)
+        
+        cache.release(task,a,failed=True)
+        self.assertNotIn(("teardown",a),log)
+        # 出错后不再复用
+        c = cache.acquire(task)
+        self.assertIsNot(c,a)
+        
+        cache.release(task,b)
+        self.assertIn(("teardown",a),log)
+        cache.release(task,c)
+        self.assertNotIn(("teardown",c),log)
+    
+    def test_drain_waits_for_running_instance(self):
+        log = []
+        task = lifecycle_task(BaseTask.LIFECYCLE_SINGLETON,log)
+        cache = InstanceCache()
+        a = cache.acquire(task)
+        self.assertEqual(cache.drain(task.name()),[])
+        cache.release(task,a)
+        self.assertEqual(log[-1],("teardown",a))
+        
+        b = cache.acquire(task)
+        cache.release(task,b)
+        self.assertEqual(cache.drain(),[b])
+    
+    def test_thread_instances_are_per_thread(self):
+        log = []
+        task = lifecycle_task(BaseTask.LIFECYCLE_THREAD,log)
+        cache = InstanceCache()
+        seen = []
+        # 两个线程同时存活,线程ID不会被重用
+        barrier = threading.Barrier(2)
+        
+        def work():
+            barrier.wait()
+            for _ in range(3):
+                ins = cache.acquire(task)
+                seen.append((threading.get_ident(),ins))
+                cache.release(task,ins)
+            barrier.wait()
+        
+        threads = [threading.Thread(target=work) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        per_thread = {}
+        for ident,ins in seen:
+            per_thread.setdefault(ident,set()).add(id(ins))
+        self.assertEqual([len(v) for v in per_thread.values()],[1,1])
+        self.assertEqual(len([e for e in log if e[0] == "setup"]),2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# 线程池测试
+import threading,time,unittest
+from TaskPool import TaskPool
+from TaskTimer import TaskTimer
+from testlib import make_task,new_timer
+
+
+def wait_for(cond,timeout:float=5.0) -> bool:
+    """
+    等待条件成立
+    """
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestTaskPool(unittest.TestCase):
+    
+    def fill(self,shed:str,max_queue:int=2) -> tuple:
+        """
+        占住唯一的工作线程后提交 4 个执行,返回 (线程池,放行事件,被丢弃的记录)
+        """
+        gate = threading.Event()
+        pool = TaskPool(1,1,name="test_" + shed,max_queue=max_queue,shed=shed,block_timeout=0.2)
+        self.addCleanup(pool.shutdown,False)
+        self.addCleanup(gate.set)
+        pool.submit(gate.wait)
+        self.assertTrue(wait_for(lambda: pool.stats()["queued"] == 0))
+        
+        shed_log = []
+        for i in range(4):
+            pool.dispatch("a",0,lambda: None,{},on_shed=lambda reason,i=i: shed_log.append((i,reason)))
+        return pool,gate,shed_log
+    
+    def test_reject_newest(self):
+        pool,_,shed_log = self.fill(TaskPool.SHED_REJECT_NEWEST)
+        self.assertEqual(shed_log,[(2,TaskPool.SHED_REJECT_NEWEST),(3,TaskPool.SHED_REJECT_NEWEST)])
+        self.assertEqual(pool.saturation(),1.0)
+        self.assertEqual(pool.stats()["shed"],2)
+    
+    def test_drop_oldest_same_task(self):
+        _,_,shed_log = self.fill(TaskPool.SHED_DROP_OLDEST_SAME_TASK)
+        self.assertEqual(shed_log,[(0,TaskPool.SHED_DROP_OLDEST_SAME_TASK),(1,TaskPool.SHED_DROP_OLDEST_SAME_TASK)])
+    
+    def test_block_times_out(self):
+        started = time.monotonic()
+        _,_,shed_log = self.fill(TaskPool.SHED_BLOCK)
+        self.assertGreaterEqual(time.monotonic() - started,0.4)
+        self.assertEqual([reason for _,reason in shed_log],[TaskPool.SHED_BLOCK] * 2)
+    
+    def test_submit_skips_admission(self):
+        # Executor 接口(例如 run_in_executor)不受排队上限限制
+        pool,gate,_ = self.fill(TaskPool.SHED_BLOCK)
+        started = time.monotonic()
+        future = pool.submit(lambda: 42)
+        self.assertLess(time.monotonic() - started,0.1)
+        gate.set()
+        self.assertEqual(future.result(timeout=2),42)
+    
+    def test_grows_when_busy_and_shrinks_when_idle(self):
+        gate = threading.Event()
+        pool = TaskPool(1,3,keep_alive=0.1,name="test_elastic")
+        self.addCleanup(pool.shutdown,False)
+        self.addCleanup(gate.set)
+        self.assertEqual(pool.size(),1)
+        
+        futures = [pool.submit(gate.wait,5) for _ in range(4)]
+        self.assertTrue(wait_for(lambda: pool.stats()["queued"] == 1))
+        self.assertEqual(pool.size(),3)
+        self.assertEqual([e["event"] for e in pool.events()],["grow","grow"])
+        
+        gate.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertTrue(wait_for(lambda: pool.size() == 1))
+        self.assertEqual(pool.stats()["shrink"],2)
+        self.assertEqual(pool.stats()["peak"],3)
+    
+    def test_priority_order(self):
+        gate = threading.Event()
+        pool = TaskPool(1,1,name="test_priority")
+        self.addCleanup(pool.shutdown,False)
+        self.addCleanup(gate.set)
+        pool.submit(gate.wait,5)
+        self.assertTrue(wait_for(lambda: pool.stats()["queued"] == 0))
+        
+        order = []
+        pool.submit_priority(5,order.append,"low")
+        pool.submit_priority(0,order.append,"high")
+        last = pool.submit_priority(5,order.append,"low2")
+        gate.set()
+        last.result(timeout=5)
+        self.assertEqual(order,["high","low","low2"])
+    
+    def test_bulkhead_pools(self):
+        timer = new_timer(TaskTimer.SCHED_MODE_HEAP)
+        io = timer.add_pool("io",1,2)
+        self.addCleanup(io.shutdown,False)
+        self.assertIs(timer._TaskTimer__task_pool(make_task("test_io",pool_name="io")),io)
+        self.assertIsNot(timer._TaskTimer__task_pool(make_task("test_default")),io)
+        with self.assertRaises(ValueError):
+            timer.add_pool("io",1,2)
+
+
+if __name__ == "__main__":
+    unittest.main()
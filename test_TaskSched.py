@@ -0,0 +1,109 @@
+# 截止时间调度结构测试
+import datetime,random,unittest
+from TaskFactory import BaseTask
+from TaskSched import HeapScheduler,WheelScheduler
+from TaskTable import TaskTable
+from TaskTimer import TaskTimer
+import TaskClock
+from testlib import FakeClock,due_jobs,make_task,new_timer
+
+
+class TestSchedulers(unittest.TestCase):
+    
+    def replay(self,sched,ops:list,steps:list) -> list:
+        """
+        按相同的操作和时间推进调度器,返回每次弹出的 (截止时间,键) 列表
+        """
+        fired = []
+        ops = list(ops)
+        for now in steps:
+            while ops and ops[0][0] <= now:
+                _,op,key,deadline = ops.pop(0)
+                if op == "push":
+                    sched.push(key,deadline,key)
+                else:
+                    sched.cancel(key)
+            fired.append(sorted((deadline,key) for deadline,key,_ in sched.pop_due(now)))
+        return fired
+    
+    def test_heap_and_wheel_fire_in_same_order(self):
+        rnd = random.Random(7)
+        start = 1700000000.0
+        ops = []
+        for i in range(2000):
+            at = start + rnd.uniform(0,86400)
+            op = rnd.choice(("push","push","push","cancel"))
+            ops.append((at,op,"k%d" % rnd.randrange(500),at + rnd.choice((0.5,30,3000,90000,400 * 86400)) * rnd.random()))
+        ops.sort()
+        
+        steps = []
+        now = start
+        while now < start + 3 * 86400:
+            now += rnd.choice((0.3,1,7,61,900))
+            steps.append(now)
+        
+        heap = self.replay(HeapScheduler(),ops,steps)
+        wheel = self.replay(WheelScheduler(start=start),ops,steps)
+        self.assertEqual(heap,wheel)
+        self.assertTrue(any(heap))
+    
+    def test_next_deadline(self):
+        for sched in (HeapScheduler(),WheelScheduler(start=100.0)):
+            self.assertEqual(sched.next_deadline(),None)
+            sched.push("a",105.5,"a")
+            sched.push("b",103.0,"b")
+            self.assertLessEqual(sched.next_deadline(),103.0)
+            sched.cancel("b")
+            self.assertEqual(sched.pop_due(104.0),[])
+            self.assertEqual(sched.pop_due(106.0),[(105.5,"a","a")])
+            self.assertEqual(len(sched),0)
+
+
+class TestDeadlineTimer(unittest.TestCase):
+    
+    def setUp(self):
+        self.start = TaskClock.Localize(datetime.datetime(2026,5,4,10,0,0)).timestamp() + 0.5
+    
+    def register(self,**hooks) -> type:
+        task = make_task("test_deadline",run_type=BaseTask.TASK_RUN_SCHEDULE,shcd_con="* * * * * * 0,30",**hooks)
+        TaskTable.register(task)
+        self.addCleanup(TaskTable.unregister,task)
+        return task
+    
+    def test_schedule_entry_fires_and_rearms(self):
+        task = self.register()
+        with FakeClock(wall=self.start) as clock:
+            timer = new_timer(TaskTimer.SCHED_MODE_HEAP)
+            timer._TaskTimer__arm_task(task)
+            self.assertEqual(due_jobs(timer),[])
+            
+            clock.advance(29.5)
+            jobs = due_jobs(timer)
+            self.assertEqual([func.__name__ for func,_ in jobs],["__run_task"])
+            self.assertEqual(jobs[0][1]["tm"].timestamp(),self.start + 29.5)
+            
+            # 下一次执行时间已加入调度
+            clock.advance(29.9)
+            self.assertEqual(due_jobs(timer),[])
+            clock.advance(0.1)
+            jobs = due_jobs(timer)
+            self.assertEqual(jobs[0][1]["tm"].timestamp(),self.start + 59.5)
+    
+    def test_wall_clock_step_back_rearms_without_running(self):
+        task = self.register()
+        with FakeClock(wall=self.start) as clock:
+            timer = new_timer(TaskTimer.SCHED_MODE_HEAP)
+            timer._TaskTimer__arm_task(task)
+            
+            # 单调时钟到期时系统时间已回拨,不提前执行
+            clock.advance(29.5)
+            clock.step(-10)
+            self.assertEqual(due_jobs(timer),[])
+            clock.advance(9.9)
+            self.assertEqual(due_jobs(timer),[])
+            clock.advance(0.1)
+            self.assertEqual([func.__name__ for func,_ in due_jobs(timer)],["__run_task"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# 状态统计测试
+import threading,unittest
+from TaskStat import StatManager
+from testlib import make_task
+import TaskClock
+
+
+class TestStatManager(unittest.TestCase):
+    
+    def setUp(self):
+        self.task = make_task("test_stat",alias="test_stat_alias")
+        self.stat = StatManager(task=self.task)
+        st = TaskClock.Now()
+        self.stat.stat(success=True,st=st,ed=st,mem=0,cpu=0,rety=False,msg="",cost=0.25)
+        self.stat.stat(success=False,st=st,ed=st,mem=0,cpu=0,rety=True,msg="boom",cost=0.5)
+    
+    def tearDown(self):
+        StatManager.task_stats.pop(self.task.name(),None)
+    
+    def test_summary(self):
+        text = self.stat.summary()
+        self.assertIn("test_stat_alias",text)
+        self.assertIn("0.500000",text)
+    
+    def test_detail(self):
+        text = self.stat.detail()
+        self.assertIn("0.250000",text)
+        self.assertIn("boom",text)
+        
+        text = self.stat.detail(after=1)
+        self.assertNotIn("0.250000",text)
+        self.assertIn("boom",text)
+    
+    def test_counters_from_many_threads(self):
+        before = StatManager.skipped_times
+        
+        def work():
+            for _ in range(5000):
+                self.stat.stat_skipped()
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.stat.skipped,40000)
+        self.assertEqual(StatManager.skipped_times - before,40000)
+
+
+if __name__ == "__main__":
+    unittest.main()
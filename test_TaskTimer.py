@@ -0,0 +1,251 @@
+# 定时器测试
+import datetime,queue,threading,time,unittest
+from TaskFactory import BaseTask
+from TaskTable import TaskTable
+from TaskTimer import RunKwargs,TaskTimer
+from TaskStat import StatManager
+import TaskClock
+from testlib import FakeClock,due_jobs,make_task,new_timer
+
+
+def drain(q:queue.Queue) -> list:
+    """
+    取出队列中的全部元素
+    """
+    items = []
+    while True:
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            return items
+
+
+def wait_for(cond,timeout:float=5.0) -> bool:
+    """
+    等待条件成立
+    """
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestRunKwargs(unittest.TestCase):
+    
+    def test_cancel_only_when_accepted(self):
+        def run_tm(self,tm):
+            return True
+        
+        def run_cancel(self,tm,cancel):
+            return True
+        
+        def run_kwargs(self,**kwargs):
+            return True
+        
+        cancel = threading.Event()
+        for run,keys in ((run_tm,["tm"]),(run_cancel,["cancel","tm"]),(run_kwargs,["cancel","tm"])):
+            ins = make_task("test_kwargs",run=run)()
+            self.assertEqual(sorted(RunKwargs(ins.run,tm=None,cancel=cancel)),keys)
+            self.assertEqual(sorted(RunKwargs(ins.run,tm=None)),["tm"])
+
+
+class TestThreadExecution(unittest.TestCase):
+    
+    def setUp(self):
+        self.timer = new_timer(TaskTimer.SCHED_MODE_HEAP)
+        self.tm = TaskClock.Now()
+        # 各次尝试的 (执行时间,取消标记)
+        self.calls = []
+        self.entered = threading.Semaphore(0)
+    
+    def task(self,name:str,gates:list,**hooks) -> type:
+        """
+        第 n 次调用等待 gates[n] 放行,放行后返回 gates[n] 的结果
+        """
+        def run(ins,tm,cancel):
+            gate,result = gates[len(self.calls)]
+            self.calls.append((tm,cancel))
+            self.entered.release()
+            gate(cancel)
+            return result
+        
+        self.addCleanup(StatManager.task_stats.pop,name,None)
+        return make_task(name,run=run,**hooks)
+    
+    def start(self,func,**kwargs) -> threading.Thread:
+        thread = threading.Thread(target=func,kwargs=kwargs,daemon=True)
+        thread.start()
+        self.assertTrue(self.entered.acquire(timeout=5))
+        return thread
+    
+    def test_detached_attempt_keeps_retry_timing(self):
+        first = threading.Event()
+        second = threading.Event()
+        task = self.task("test_end_ns",[(lambda c: first.wait(5),True),(lambda c: second.wait(5),True)],timeout=1,trytimes=2)
+        with FakeClock(wall=TaskClock.NowTs(),mono=TaskClock.MonoTs()) as clock:
+            t1 = self.start(self.timer._TaskTimer__run_task,task=task,tm=self.tm)
+            
+            # 第一次尝试超时后脱离,重试开始运行
+            clock.advance(1)
+            for func,kwargs in due_jobs(self.timer):
+                func(**kwargs)
+            jobs = due_jobs(self.timer)
+            self.assertEqual([func.__name__ for func,_ in jobs],["__run_attempt"])
+            t2 = self.start(jobs[0][0],**jobs[0][1])
+            
+            # 脱离的尝试结束后不覆盖重试的计时
+            first.set()
+            t1.join(5)
+            running = self.timer.executions()
+            self.assertEqual([(e["attempt"],e["running"] > 0) for e in running],[(2,True)])
+            
+            second.set()
+            t2.join(5)
+        self.assertEqual(self.timer.executions(),[])
+    
+    def test_cancel_previous_sets_cancel_on_running_attempt(self):
+        later = self.tm + datetime.timedelta(seconds=1)
+        task = self.task("test_cancel_previous",[(lambda c: c.wait(5),False),(lambda c: None,True)],
+                         max_instances=1,overlap=BaseTask.OVERLAP_CANCEL_PREVIOUS,trytimes=2)
+        t1 = self.start(self.timer._TaskTimer__run_task,task=task,tm=self.tm)
+        
+        # 达到并发上限,正在运行的尝试收到取消,结束后不再重试,执行等待的一次
+        self.timer._TaskTimer__run_task(task=task,tm=later)
+        t1.join(5)
+        self.assertTrue(self.entered.acquire(timeout=5))
+        self.assertTrue(self.calls[0][1].is_set())
+        self.assertEqual(self.calls[1][0],later)
+        self.assertFalse(self.calls[1][1].is_set())
+        self.assertTrue(wait_for(lambda: not self.timer.executions()))
+        self.assertEqual(len(self.timer._TaskTimer__sched),0)
+        self.assertEqual(len(self.calls),2)
+
+
+class TestSpread(unittest.TestCase):
+    
+    def setUp(self):
+        self.start = TaskClock.Localize(datetime.datetime(2026,5,4,10,0,0)).timestamp() + 0.2
+        self.timer = new_timer(TaskTimer.SCHED_MODE_TICK)
+        # 调度线程已启动,任务变更会更新调度
+        self.timer._TaskTimer__sched_running = True
+    
+    def register(self,name:str,cron:str,**hooks) -> type:
+        task = make_task(name,run_type=BaseTask.TASK_RUN_SCHEDULE,shcd_con=cron,spread=0.5,**hooks)
+        TaskTable.register(task)
+        self.addCleanup(TaskTable.unregister,task)
+        self.addCleanup(StatManager.task_stats.pop,name,None)
+        return task
+    
+    def test_spread_respects_day_field(self):
+        self.register("test_spread_today","* * * * * * *")
+        self.register("test_spread_other_day","* * 6-6 * * * *")
+        with FakeClock(wall=self.start):
+            self.timer._TaskTimer__on_ticks([int(self.start)])
+        self.assertEqual(sorted(self.timer._TaskTimer__spread_keys),["test_spread_today"])
+        self.assertEqual(len(self.timer._TaskTimer__sched),1)
+    
+    def test_remove_cancels_spread_entries(self):
+        task = self.register("test_spread_removed","* * * * * * *",misfire_grace=5)
+        with FakeClock(wall=self.start):
+            self.timer._TaskTimer__on_ticks([int(self.start) - 1,int(self.start)])
+            self.assertEqual(len(self.timer._TaskTimer__sched),2)
+            TaskTable.unregister(task)
+            self.assertEqual(len(self.timer._TaskTimer__sched),0)
+            self.assertEqual(self.timer._TaskTimer__spread_keys,{})
+    
+    def test_remove_cancels_waiting_retry(self):
+        def run(self,tm):
+            raise RuntimeError("boom")
+        
+        task = make_task("test_retry_removed",run=run,run_type=BaseTask.TASK_RUN_SINGLE,trytimes=3,try_after=60)
+        self.addCleanup(StatManager.task_stats.pop,task.name(),None)
+        TaskTable.register(task)
+        self.timer._TaskTimer__run_task(task=task,tm=TaskClock.Now())
+        self.assertEqual([e["attempt"] for e in self.timer.executions()],[1])
+        self.assertEqual(len(self.timer._TaskTimer__sched),1)
+        
+        TaskTable.unregister(task)
+        self.assertEqual(self.timer.executions(),[])
+        self.assertEqual(len(self.timer._TaskTimer__sched),0)
+
+
+class TestMisfire(unittest.TestCase):
+    
+    def setUp(self):
+        self.start = TaskClock.Localize(datetime.datetime(2026,5,4,10,0,0)).timestamp() + 0.5
+    
+    def register(self,name:str,misfire:str) -> type:
+        task = make_task(name,run_type=BaseTask.TASK_RUN_SCHEDULE,shcd_con="* * * * * * 0,10,20,30,40,50",misfire=misfire)
+        TaskTable.register(task)
+        self.addCleanup(TaskTable.unregister,task)
+        self.addCleanup(StatManager.task_stats.pop,name,None)
+        return task
+    
+    def late_runs(self,task:type,max_runs:int=None) -> tuple:
+        """
+        第一次执行时间到期后晚了 85 秒才处理,返回 (补执行的时间戳,错过次数,下一次截止时间)
+        """
+        with FakeClock(wall=self.start) as clock:
+            timer = new_timer(TaskTimer.SCHED_MODE_HEAP)
+            if max_runs != None:
+                timer.MISFIRE_MAX_RUNS = max_runs
+            timer._TaskTimer__arm_task(task)
+            clock.advance(95)
+            runs = [kwargs["tm"].timestamp() - self.start + 0.5 for _,kwargs in due_jobs(timer)]
+            rearm = timer._TaskTimer__sched.next_deadline() - clock.mono
+        return runs,StatManager(task=task).missed,rearm
+    
+    def test_fire_once(self):
+        runs,missed,rearm = self.late_runs(self.register("test_misfire_once",BaseTask.MISFIRE_FIRE_ONCE))
+        self.assertEqual(runs,[90])
+        self.assertEqual(missed,8)
+        self.assertEqual(rearm,4.5)
+    
+    def test_fire_all(self):
+        runs,missed,_ = self.late_runs(self.register("test_misfire_all",BaseTask.MISFIRE_FIRE_ALL))
+        self.assertEqual(runs,[10,20,30,40,50,60,70,80,90])
+        self.assertEqual(missed,0)
+    
+    def test_fire_all_is_bounded(self):
+        runs,missed,_ = self.late_runs(self.register("test_misfire_all_bounded",BaseTask.MISFIRE_FIRE_ALL),max_runs=3)
+        self.assertEqual(runs,[70,80,90])
+        self.assertEqual(missed,6)
+    
+    def test_skip(self):
+        runs,missed,rearm = self.late_runs(self.register("test_misfire_skip",BaseTask.MISFIRE_SKIP))
+        self.assertEqual(runs,[])
+        self.assertEqual(missed,9)
+        self.assertEqual(rearm,4.5)
+
+
+class TestHeartbeat(unittest.TestCase):
+    
+    def test_ticks_follow_wall_clock_step_back(self):
+        with FakeClock(wall=1800000000.2) as clock:
+            timer = new_timer(TaskTimer.SCHED_MODE_TICK)
+            ticks = timer._TaskTimer__task_sched_queue
+            tick = int(clock.wall)
+            
+            clock.advance(3)
+            tick = timer._TaskTimer__heartbeat(tick)
+            self.assertEqual(drain(ticks),[1800000001,1800000002,1800000003])
+            
+            # 回拨后从新的时间继续心跳
+            clock.step(-10)
+            clock.advance(1)
+            tick = timer._TaskTimer__heartbeat(tick)
+            self.assertEqual(drain(ticks),[1799999994])
+            clock.advance(1)
+            tick = timer._TaskTimer__heartbeat(tick)
+            self.assertEqual(drain(ticks),[1799999995])
+            
+            # 1 秒内的校准误差不重置
+            clock.step(-0.5)
+            self.assertEqual(timer._TaskTimer__heartbeat(tick),tick)
+            self.assertEqual(drain(ticks),[])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# 测试公共方法
+import datetime
+from TaskFactory import BaseTask
+from TaskTimer import TaskTimer
+import TaskClock
+
+
+def run_ok(self,tm:datetime.datetime) -> bool:
+    """
+    默认的 run,直接返回成功
+    """
+    return True
+
+
+def make_task(name:str,run=None,methods:dict=None,**hooks) -> type:
+    """
+    创建测试任务类,未指定的钩子返回不影响调度的默认值
+    
+    :param name: str 任务名称
+    :param run: function run 方法,签名由测试指定,默认直接返回成功
+    :param methods: dict 其余实例方法 {方法名:函数},如 setup/teardown
+    :param hooks: 钩子的返回值,如 run_type=BaseTask.TASK_RUN_SCHEDULE
+    :return: type
+    """
+    values = {
+        "run_type":BaseTask.TASK_RUN_SECOND_LOOP,
+        "shcd_con":None,
+        "loop_sed":1,
+        "single_tm":None,
+        "name":name,
+        "alias":name,
+        "timeout":0,
+        "trytimes":1,
+        "try_after":0,
+        "emails":[],
+        "logfile":"",
+        "logsuccess":False,
+        "logfield":False,
+        "logabnormal":False,
+    }
+    values.update(hooks)
+    
+    attrs = {key:staticmethod(lambda value=value: value) for key,value in values.items()}
+    attrs["logsend"] = staticmethod(lambda msg: None)
+    attrs["run"] = run or run_ok
+    attrs.update(methods or {})
+    return type(name,(BaseTask,),attrs)
+
+
+class FakeClock:
+    """
+    替换 TaskClock 的墙上时间和单调时钟,由测试推进,用于 with 语句
+    """
+    
+    def __init__(self,wall:float,mono:float=1000.0):
+        """
+        :param wall: float 墙上时间戳
+        :param mono: float 单调时钟
+        """
+        self.wall = wall
+        self.mono = mono
+        self.__saved = None
+    
+    def advance(self,seconds:float):
+        """
+        时间前进,墙上时间和单调时钟同时推进
+        
+        :param seconds: float 秒
+        """
+        self.wall += seconds
+        self.mono += seconds
+    
+    def step(self,seconds:float):
+        """
+        系统时间跳变,只改变墙上时间
+        
+        :param seconds: float 秒,负数为回拨
+        """
+        self.wall += seconds
+    
+    def __enter__(self):
+        self.__saved = (TaskClock.NowTs,TaskClock.MonoTs)
+        TaskClock.NowTs = lambda: self.wall
+        TaskClock.MonoTs = lambda: self.mono
+        return self
+    
+    def __exit__(self,*exc):
+        TaskClock.NowTs,TaskClock.MonoTs = self.__saved
+        return False
+
+
+def new_timer(mode:str,console:bool=False):
+    """
+    创建独立的定时器,不启动任何线程,绕过单例避免测试之间相互影响
+    
+    :param mode: str 调度模式
+    :param console: bool 是否打印执行记录
+    :return: TaskTimer
+    """
+    timer = object.__new__(TaskTimer)
+    timer.__init__(console=console,mode=mode)
+    return timer
+
+
+def due_jobs(timer) -> list:
+    """
+    弹出当前单调时钟下到期的条目,按定时器的处理方式返回需要提交的执行
+    
+    :param timer: TaskTimer 定时器
+    :return: list [(执行函数,参数)]
+    """
+    jobs = []
+    sched = timer._TaskTimer__sched
+    for deadline,key,(kind,task,tm) in sched.pop_due(TaskClock.MonoTs()):
+        jobs.extend(timer._TaskTimer__on_due(kind=kind,task=task,tm=tm,deadline=deadline,key=key))
+    return jobs